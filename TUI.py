@@ -1,5 +1,13 @@
 from classes2048 import Game2048
 from classes2048 import Direction
+from classes2048 import MOVE_BITS
+from classes2048 import freeze_board
+from classes2048 import suggest_position
+from render2048 import BoardRenderer
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import random
+import time
 # TUI STANDS FOR 'TEXT USER INTERFACE'
 
 '''
@@ -9,75 +17,228 @@ when the game starts.
 
 When the game is over, the code stops running and the users score is displayed
 to standard output.
+
+With --autoplay, the AI plays the whole game by itself and the board is
+redrawn in place after every move (see render2048.py), so games can be
+watched live. --fps sets how many moves are made per second, and --fps 0
+plays as fast as possible:
+
+    python3 TUI.py --autoplay --fps 20
+
+While the player is deciding on a move, the AI's suggestion for the board
+is already being worked out in the background, so typing 'AI' usually gets
+an answer straight away.
 '''
 
-# BELOW ARE THE WELCOME INSTRUCTIONS WHEN A USER RUNS THE TUI
-print("\nWELCOME TO 2048!!!!\n")
-print("To move you have a few options...")
-print("You can play by using the 'W', 'A', 'S', and 'D' keys (gamer style!)\n")
-print("Input 'w' to move up")
-print("Input 'a' to move left")
-print("Input 'a' to move down")
-print("Input 'a' to move right\n")
-print("You can also input 'AI' to have my code suggest a move for you.\n")
-print("WARNING: The AI assumes the user has stacked it's largest")
-print("tiles on the bottom of the board, as this kind of approach")
-print("is one of the most common strategies.\n")
-print("The AI is pretty powerful, but the moves it suggests only win")
-print("about one in four games so don't rely on it too much...\n")
-
-game = Game2048()
-is_game_won = False
-
-# game starts with two pieces on the board
-game.add_random_piece(game.board)
-game.add_random_piece(game.board)
-
-# continules to ask for user input until game is over or user quits after 
-# winning
-while not game.is_game_over():
-    move = None
-
-    print("Score:", game.score)
-    game.show_board(game.board)
+class Speculator:
+    def __init__(self, seed=None):
+        '''
+        Works out the AI's suggestion for the board on screen in a background
+        thread while the player is still thinking. The search runs on a copy
+        of the board (see "suggest_position"), so it never changes the game
+        the player is playing. Suggestions are kept for one position and
+        thrown away once the board changes.
 
-    if not is_game_won and game.is_game_won():
-        is_game_won = True
-        print("Congrats!!!!! You Won!!!")
-        print("To continue press 'y'. To quit press 'n'.")
-        will_continue = input("Continue? y/n: ")
-        if will_continue == 'y':
-            will_continue_bool = True
-        else:
-            will_continue_bool = False
+        Perameters:
+            seed (int): seed for the random numbers used by the AI, or None
+                for a random seed
+        '''
+        self.executor = ThreadPoolExecutor(1)
+        self.rng = random.Random(seed)
+        self.key = None
+        self.future = None
+
+    def start(self, game):
+        '''
+        Starts working out the suggestion for the current position of the
+        game, unless it is already being worked out.
+        '''
+        key = (freeze_board(game.board), game.score, game.last_move_up)
+        if key == self.key:
+            return
+        self.discard()
+        self.key = key
+        self.future = self.executor.submit(suggest_position,
+            (key[0], game.score, game.last_move_up, self.rng.getrandbits(32)))
+
+    def discard(self):
+        '''
+        Throws away the suggestion being worked out, for example after the
+        player made a move of their own. A search that has already started
+        can't be stopped, but its result is ignored.
+        '''
+        if self.future != None:
+            self.future.cancel()
+        self.key = None
+        self.future = None
+
+    def suggest(self, game):
+        '''
+        Returns the suggested move for the current position of the game,
+        waiting for the background search if it hasn't finished yet. Like
+        "suggest_move", it updates game.last_move_up.
+
+        Returns:
+            (Direction): The direction the AI recomends the user moves.
+        '''
+        self.start(game)
+        direction, game.last_move_up = self.future.result()
+        self.discard()
+        return direction
+
+    def close(self):
+        '''
+        Throws away any suggestion being worked out and stops the thread.
+        '''
+        self.discard()
+        self.executor.shutdown(wait=False)
+
+def autoplay(fps=10, seed=None):
+    '''
+    Lets the AI play a game by itself, drawing the board after every move.
+
+    Perameters:
+        fps (float): number of moves made per second, or 0 to play as fast
+            as possible
+        seed (int): seed for the random numbers of the game, or None for a
+            random seed
+    '''
+    game = Game2048('bitboard', random.Random(seed))
+    game.add_random_piece(game.board)
+    game.add_random_piece(game.board)
+    renderer = BoardRenderer()
+    moves = 0
+    start = time.monotonic()
+    try:
+        while True:
+            seconds = time.monotonic() - start
+            speed = round(moves / seconds, 1) if seconds > 0 else 0.0
+            renderer.draw(game.board, "Score: " + str(game.score),
+                          "Moves: " + str(moves) + "  moves per second: " + str(speed))
+            if game.is_game_over():
+                break
+
+            move = game.suggest_move()
+            mask = game.legal_moves(game.board)
+            if not mask & MOVE_BITS[move]:
+                # The AI sometimes suggests a move that doesn't change the
+                # board, so the first possible move is made instead
+                move = next(direction for direction in Direction if mask & MOVE_BITS[direction])
+            game.move(move, game.board)
+            moves += 1
+
+            if fps > 0:
+                # Waits for the time of the next frame, without letting the
+                # frames drift if a suggestion took a long time
+                delay = start + moves / fps - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        renderer.close()
+
+    print("GAME OVER" if game.is_game_over() else "STOPPED")
+    print("Your score was", game.score, "and the largest piece was", game.get_largest_piece())
+
+def play(seed=None):
+    '''
+    Plays a game where the user types every move, or 'AI' for a suggestion.
+
+    Perameters:
+        seed (int): seed for the random numbers of the game, or None for a
+            random seed
+    '''
+    # BELOW ARE THE WELCOME INSTRUCTIONS WHEN A USER RUNS THE TUI
+    print("\nWELCOME TO 2048!!!!\n")
+    print("To move you have a few options...")
+    print("You can play by using the 'W', 'A', 'S', and 'D' keys (gamer style!)\n")
+    print("Input 'w' to move up")
+    print("Input 'a' to move left")
+    print("Input 'a' to move down")
+    print("Input 'a' to move right\n")
+    print("You can also input 'AI' to have my code suggest a move for you.\n")
+    print("WARNING: The AI assumes the user has stacked it's largest")
+    print("tiles on the bottom of the board, as this kind of approach")
+    print("is one of the most common strategies.\n")
+    print("The AI is pretty powerful, but the moves it suggests only win")
+    print("about one in four games so don't rely on it too much...\n")
+
+    game = Game2048('list', random.Random(seed))
+    speculator = Speculator(seed)
+    is_game_won = False
+
+    # game starts with two pieces on the board
+    game.add_random_piece(game.board)
+    game.add_random_piece(game.board)
+
+    # continules to ask for user input until game is over or user quits after 
+    # winning
+    while not game.is_game_over():
+        move = None
+
+        print("Score:", game.score)
+        game.show_board(game.board)
+        speculator.start(game)
+
+        if not is_game_won and game.is_game_won():
+            is_game_won = True
+            print("Congrats!!!!! You Won!!!")
+            print("To continue press 'y'. To quit press 'n'.")
+            will_continue = input("Continue? y/n: ")
+            if will_continue == 'y':
+                will_continue_bool = True
+            else:
+                will_continue_bool = False
         
-        if not will_continue_bool:
-            break
-
-    move_str = input("Type a direction: ").upper()
-    print()
-    if move_str == "A":
-        move = Direction.LEFT
-    elif move_str == "D":
-        move = Direction.RIGHT
-    elif move_str == "S":
-        move = Direction.DOWN
-    elif move_str == "W":
-        move = Direction.UP
-    elif move_str == "AI":
-        move = game.suggest_move()
-    else:
-        print("Enter a valid move for the given board:")
+            if not will_continue_bool:
+                break
+
+        move_str = input("Type a direction: ").upper()
+        print()
+        if move_str == "A":
+            move = Direction.LEFT
+        elif move_str == "D":
+            move = Direction.RIGHT
+        elif move_str == "S":
+            move = Direction.DOWN
+        elif move_str == "W":
+            move = Direction.UP
+        elif move_str == "AI":
+            move = speculator.suggest(game)
+        else:
+            print("Enter a valid move for the given board:")
     
-    if not game.is_move_possible(move, game.board):
-        print("Enter a valid move for the given board:")
-        move = None
+        if not game.is_move_possible(move, game.board):
+            print("Enter a valid move for the given board:")
+            move = None
 
-    if move != None:
-        game.move(move, game.board)
+        if move != None:
+            # The board is about to change, so a suggestion for it is no
+            # longer needed
+            speculator.discard()
+            game.move(move, game.board)
 
-game.show_board(game.board)
+    speculator.close()
+    game.show_board(game.board)
 
-print("GAME OVER")
-print("Your score was", game.score)
+    print("GAME OVER")
+    print("Your score was", game.score)
+
+def main():
+    parser = argparse.ArgumentParser(description='Play 2048 in the terminal.')
+    parser.add_argument('--autoplay', action='store_true',
+                        help='let the AI play and watch the game live')
+    parser.add_argument('--fps', type=float, default=10,
+                        help='moves per second in autoplay, 0 for as fast as possible')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed for the random numbers of the game')
+    args = parser.parse_args()
+
+    if args.autoplay:
+        autoplay(args.fps, args.seed)
+    else:
+        play(args.seed)
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+from classes2048 import Game2048
+from classes2048 import HeuristicWeights
+from runstats2048 import PairedComparison
+from runstats2048 import PAIRED_METRICS
+from simulategames import BACKEND
+from simulategames import game_seed
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import random
+NUM_GAMES = 200
+AB_SEED = 1
+CHUNK_SIZE = 10
+'''
+File compares two versions of the AI by letting both play the same games. An
+AI is described by a few settings separated by commas:
+    1. ai=default or ai=expectimax
+    2. depth=N: moves looked ahead (the default AI looks ahead 3 moves and
+       expectimax 2)
+    3. weights=FILE: JSON file of HeuristicWeights for the default AI, for
+       example the output of tune2048.py
+For example:
+
+    python3 ab2048.py --a "depth=2" --b "" --games 500
+    python3 ab2048.py --a "weights=weights.json" --b "" --workers 8
+
+Game i of A and game i of B use the same random numbers: the pieces added to
+the board come from one generator seeded from the master seed and i, and the
+AI draws its own random numbers from a second generator. Every new piece
+takes the same 17 random numbers whatever the board: one for whether it is a
+two or a four and a key for each of the 16 spaces, and it goes in the empty
+space with the largest key. A and B then get the same twos and fours in the
+same order whatever moves they make, and the same space whenever the empty
+space with the largest key is the same on both boards. Two identical AIs
+play exactly the same games.
+
+Because both AIs face the same luck, the difference between them is measured
+on each pair of games, and the luck they share cancels out. How much that
+helps depends on how long the two AIs keep making the same moves. Once their
+boards differ, about half of the new pieces still go in the same space, but
+the games soon play out very differently, so for AIs that differ early in
+the game the paired interval is not much narrower. For the win rate, the
+mean score and the largest tile (in doublings, so 1 means a tile twice as
+large), the output gives the mean difference A - B with a 95% confidence
+interval from the pairs. It also gives the interval that two independent runs
+of the same size would have had, and how many times more games those runs
+would need to be as sure, which shows how much the pairing helped.
+'''
+
+def parse_variant(text):
+    '''
+    Reads the settings of an AI (see above).
+
+    Perameters:
+        text (str): settings separated by commas, e.g. 'ai=expectimax,depth=3'
+
+    Returns:
+        (dict): 'ai', 'depth' (None for the default) and 'weights'
+            (HeuristicWeights or None)
+    '''
+    variant = {'ai': 'default', 'depth': None, 'weights': None}
+    for setting in text.split(','):
+        setting = setting.strip()
+        if not setting:
+            continue
+        name, equals, value = setting.partition('=')
+        if name == 'ai' and value in ('default', 'expectimax'):
+            variant['ai'] = value
+        elif name == 'depth' and value.isdigit() and int(value) > 0:
+            variant['depth'] = int(value)
+        elif name == 'weights':
+            with open(value) as f:
+                data = json.load(f)
+            # The output of tune2048.py holds the weights along with its results
+            variant['weights'] = HeuristicWeights.from_dict(data.get('weights', data))
+        else:
+            raise ValueError('bad setting ' + repr(setting))
+    return variant
+
+def play_variant(variant, seed):
+    '''
+    Plays one game with an AI.
+
+    Perameters:
+        variant (dict): settings of the AI (see "parse_variant")
+        seed (str): seed of the game. The pieces added to the board are
+            seeded with it and the AI's random numbers with seed + ':ai'.
+
+    Returns:
+        (tuple: (int, int)): the largest tile and the final score
+    '''
+    game = Game2048(BACKEND, random.Random(seed), weights=variant['weights'],
+                    ai_rng=random.Random(seed + ':ai'))
+    game.add_random_piece(game.board)
+    game.add_random_piece(game.board)
+    while not game.is_game_over():
+        if variant['ai'] == 'expectimax':
+            depth = variant['depth'] if variant['depth'] != None else 2
+            game.move(game.suggest_move_expectimax(depth), game.board)
+        else:
+            game.move(game.suggest_move(depth=variant['depth']), game.board)
+    return game.get_largest_piece(), game.score
+
+def play_pairs(task):
+    '''
+    Plays a chunk of pairs of games inside a worker process.
+
+    Perameters:
+        task (tuple: (int, int, int, dict, dict)): (start, num_games,
+            master_seed, variant_a, variant_b)
+
+    Returns:
+        (PairedComparison): the comparison of the pairs played
+    '''
+    start, num_games, master_seed, variant_a, variant_b = task
+    comparison = PairedComparison()
+    for i in range(start, start + num_games):
+        seed = game_seed(master_seed, i)
+        comparison.add_pair(play_variant(variant_a, seed), play_variant(variant_b, seed))
+    return comparison
+
+def compare(variant_a, variant_b, num_games=NUM_GAMES, master_seed=AB_SEED, workers=None):
+    '''
+    Lets two AIs play num_games pairs of games.
+
+    Perameters:
+        variant_a (dict): settings of A (see "parse_variant")
+        variant_b (dict): settings of B
+        num_games (int): number of pairs of games
+        master_seed (int): seed the games are seeded from
+        workers (int): number of worker processes, or None to play in this
+            process
+
+    Returns:
+        (PairedComparison): the comparison of A and B
+    '''
+    tasks = [(start, min(CHUNK_SIZE, num_games - start), master_seed, variant_a, variant_b)
+             for start in range(0, num_games, CHUNK_SIZE)]
+    comparison = PairedComparison()
+    if workers == None:
+        for task in tasks:
+            comparison.merge(play_pairs(task))
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            for chunk in pool.map(play_pairs, tasks):
+                comparison.merge(chunk)
+    return comparison
+
+def show(value, metric):
+    '''
+    Returns a number of one of PAIRED_METRICS as text, with the win rate in
+    percent.
+    '''
+    if metric == 'win':
+        return str(round(100 * value, 1))
+    if metric == 'score':
+        return str(round(value))
+    return str(round(value, 2))
+
+def print_comparison(comparison):
+    '''
+    Prints the differences between A and B to standard output.
+
+    Perameters:
+        comparison (PairedComparison): the comparison to print
+    '''
+    print("Pairs of games:", comparison.games)
+    names = {'win': 'Win rate %', 'score': 'Score', 'max_tile': 'Largest tile (doublings)'}
+    ratios = []
+    for metric in PAIRED_METRICS:
+        paired = comparison.paired_interval(metric)
+        unpaired = comparison.unpaired_interval(metric)
+        print(names[metric] + ": A", show(comparison.a[metric].mean(), metric),
+              "B", show(comparison.b[metric].mean(), metric),
+              "A - B", show(comparison.difference(metric), metric),
+              "(95% CI " + show(paired[0], metric) + " to " + show(paired[1], metric) + ",",
+              "unpaired " + show(unpaired[0], metric) + " to " + show(unpaired[1], metric) + ")")
+        if paired[1] > paired[0]:
+            ratios.append(((unpaired[1] - unpaired[0]) / (paired[1] - paired[0])) ** 2)
+    print("Games won by only A:", comparison.only_a_won, "only B:", comparison.only_b_won)
+    if ratios:
+        # Intervals shrink with the square root of the number of games
+        print("Unpaired runs would need about", round(min(ratios), 1), "to",
+              round(max(ratios), 1), "times as many games for intervals this narrow")
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two versions of the 2048 AI '
+                                                 'on the same games.')
+    parser.add_argument('--a', default='', help='settings of AI A (default: the default AI)')
+    parser.add_argument('--b', default='', help='settings of AI B (default: the default AI)')
+    parser.add_argument('--games', type=int, default=NUM_GAMES,
+                        help='number of pairs of games')
+    parser.add_argument('--seed', type=int, default=AB_SEED,
+                        help='master seed of the games')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of processes used to play the games')
+    args = parser.parse_args()
+
+    try:
+        variant_a = parse_variant(args.a)
+        variant_b = parse_variant(args.b)
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    if args.games < 1:
+        parser.error('--games must be at least 1')
+    if args.workers != None and args.workers < 1:
+        parser.error('--workers must be at least 1')
+
+    print_comparison(compare(variant_a, variant_b, args.games, args.seed, args.workers))
+
+if __name__ == '__main__':
+    main()
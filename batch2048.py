@@ -0,0 +1,416 @@
+from classes2048 import DEFAULT_WEIGHTS
+import numpy as np
+import bitboard2048
+'''
+This file simulates many games of 2048 at the same time. All of the boards
+are held in one numpy array of shape (N, 4, 4) and every step of the game
+(moving, combining, adding random pieces and checking if a game is over) is
+done for the whole batch at once.
+
+Like bitboard2048.py, boards store the exponent of each tile (a 2 is stored
+as 1, a 4 as 2, ...) and empty cells are stored as 0. Moves are made by
+packing every row into a 16 bit number and looking the result up in the row
+tables from bitboard2048.py.
+
+The "suggest_moves" function is a vectorized version of
+Game2048.suggest_move, so games played here follow the same strategy as the
+games played one at a time by simulategames.py.
+'''
+
+# Direction indexes used in this file. They are in the same order as the
+# members of classes2048.Direction.
+LEFT = 0
+RIGHT = 1
+UP = 2
+DOWN = 3
+
+# Tables are copied out of bitboard2048 the first time they are needed.
+TABLES = {}
+
+def get_tables():
+    '''
+    Returns the bitboard row tables as numpy arrays, building them the
+    first time the function is called.
+
+    Returns:
+        (dict): 'left', 'right', 'score_left' and 'score_right' arrays
+    '''
+    if not TABLES:
+        bitboard2048.build_tables()
+        TABLES['left'] = np.array(bitboard2048.ROW_LEFT, dtype=np.int64)
+        TABLES['right'] = np.array(bitboard2048.ROW_RIGHT, dtype=np.int64)
+        TABLES['score_left'] = np.array(bitboard2048.SCORE_LEFT, dtype=np.int64)
+        TABLES['score_right'] = np.array(bitboard2048.SCORE_RIGHT, dtype=np.int64)
+    return TABLES
+
+def pack_rows(boards):
+    '''
+    Packs every row of a (N, 4, 4) array of exponents into a (N, 4) array of
+    16 bit rows.
+    '''
+    b = boards.astype(np.int64)
+    return b[:, :, 0] | (b[:, :, 1] << 4) | (b[:, :, 2] << 8) | (b[:, :, 3] << 12)
+
+def unpack_rows(rows):
+    '''
+    Unpacks a (N, 4) array of 16 bit rows into a (N, 4, 4) array of exponents.
+    '''
+    shifts = np.array([0, 4, 8, 12], dtype=np.int64)
+    return ((rows[:, :, None] >> shifts) & 0xF).astype(np.uint8)
+
+def slide(boards, direction):
+    '''
+    Slides and combines every board in the batch in one direction. Does not
+    add random pieces.
+
+    Perameters:
+        boards (numpy array (N, 4, 4)): boards to move
+        direction (int): LEFT, RIGHT, UP or DOWN
+
+    Returns:
+        (tuple: (numpy array (N, 4, 4), numpy array (N,), numpy array (N,))):
+            the new boards, the points gained on each board and whether each
+            board changed
+    '''
+    tables = get_tables()
+    if direction == UP or direction == DOWN:
+        boards = boards.transpose(0, 2, 1)
+    if direction == LEFT or direction == UP:
+        rows, scores = tables['left'], tables['score_left']
+    else:
+        rows, scores = tables['right'], tables['score_right']
+
+    codes = pack_rows(boards)
+    new_codes = rows[codes]
+    new_boards = unpack_rows(new_codes)
+    if direction == UP or direction == DOWN:
+        new_boards = np.ascontiguousarray(new_boards.transpose(0, 2, 1))
+    gained = scores[codes].sum(axis=1)
+    if gained.max(initial=0) >= bitboard2048.OVERFLOW_SCORE:
+        raise ValueError('tile 65536 is too large for a bitboard')
+    changed = (new_codes != codes).any(axis=1)
+    return new_boards, gained, changed
+
+def legal_moves(boards):
+    '''
+    Returns a (N, 4) boolean array where entry [i, d] is True if moving
+    board i in direction d would change the board.
+    '''
+    tables = get_tables()
+    codes = pack_rows(boards)
+    columns = pack_rows(boards.transpose(0, 2, 1))
+    legal = np.empty((boards.shape[0], 4), dtype=bool)
+    legal[:, LEFT] = (tables['left'][codes] != codes).any(axis=1)
+    legal[:, RIGHT] = (tables['right'][codes] != codes).any(axis=1)
+    legal[:, UP] = (tables['left'][columns] != columns).any(axis=1)
+    legal[:, DOWN] = (tables['right'][columns] != columns).any(axis=1)
+    return legal
+
+def add_random_pieces(boards, mask, rng):
+    '''
+    Adds a random piece to every board selected by mask that has an empty
+    cell. Like Game2048.add_random_piece, the empty cell is chosen uniformly
+    and the new piece is a four 10% of the time and a two otherwise. Boards
+    are changed in place.
+
+    Perameters:
+        boards (numpy array (N, 4, 4)): boards to add pieces to
+        mask (numpy array (N,)): which boards get a new piece
+        rng (numpy Generator): source of random numbers
+    '''
+    flat = boards.reshape(boards.shape[0], 16)
+    empty = flat == 0
+    mask = mask & empty.any(axis=1)
+    idx = np.nonzero(mask)[0]
+    if len(idx) == 0:
+        return
+
+    # The empty cell with the largest random key is uniformly distributed
+    # among the empty cells.
+    keys = rng.random((len(idx), 16))
+    keys[~empty[idx]] = -1.0
+    cells = keys.argmax(axis=1)
+    values = np.where(rng.integers(1, 11, size=len(idx)) == 1, 2, 1)
+    flat[idx, cells] = values
+
+def rows_ordered(rows):
+    '''
+    Vectorized Game2048.is_row_ordered for a (N, 4) array of exponents.
+    '''
+    ordered = np.ones(rows.shape[0], dtype=bool)
+    last = np.zeros(rows.shape[0], dtype=rows.dtype)
+    for i in range(4):
+        cell = rows[:, i]
+        ordered &= ~((last != 0) & (cell != 0) & (cell > last))
+        last = np.where(cell != 0, cell, last)
+    return ordered
+
+def rows_stable(rows):
+    '''
+    Vectorized Game2048.is_row_stable for a (N, 4) array of exponents.
+    '''
+    full = (rows != 0).all(axis=1)
+    return full & (rows[:, :-1] != rows[:, 1:]).all(axis=1)
+
+def could_down_disrupt(rows):
+    '''
+    Vectorized Game2048.could_down_distrupt_bottom for a (N, 4) array of
+    exponents holding the bottom rows.
+    '''
+    return ((rows[:, 1:] != 0) & (rows[:, :-1] == 0)).any(axis=1)
+
+def rows_sum(rows):
+    '''
+    Vectorized Game2048.bottom_row_score for a (N, 4) array of exponents.
+    '''
+    values = np.left_shift(1, rows.astype(np.int64))
+    return np.where(rows != 0, values, 0).sum(axis=1)
+
+def largest_in_corner(boards):
+    '''
+    Vectorized check of Game2048.loc_largest_piece(board) == (3, 0).
+    '''
+    corner = boards[:, 3, 0]
+    above = boards[:, :3, :].reshape(boards.shape[0], 12).max(axis=1)
+    beside = boards[:, 3, 1:].max(axis=1)
+    return (corner != 0) & (corner > above) & (corner >= beside)
+
+def sequences():
+    '''
+    Returns the 27 sequences of three moves searched by suggest_moves, in
+    the same order that Game2048.suggest_move searches them.
+    '''
+    letters = {'D': DOWN, 'L': LEFT, 'R': RIGHT}
+    rv = []
+    for first in 'DLR':
+        for second in 'DLR':
+            for third in 'DLR':
+                rv.append((letters[first], letters[second], letters[third]))
+    return rv
+
+def assess_sequences(boards, rng, weights=DEFAULT_WEIGHTS):
+    '''
+    Vectorized Game2048.assess_moves. Scores all 27 sequences of three moves
+    for every board in the batch.
+
+    Perameters:
+        boards (numpy array (N, 4, 4)): boards to assess
+        rng (numpy Generator): source of random numbers for the pieces added
+            during the lookahead
+        weights (classes2048.HeuristicWeights): weights of the assessment
+
+    Returns:
+        assessments (numpy array (N, 27)): score of every sequence, or -inf
+            where the first move of the sequence is not possible
+    '''
+    n = boards.shape[0]
+    legal = legal_moves(boards)
+    bottom = boards[:, 3, :]
+    ordered = rows_ordered(bottom)
+    disrupt = ordered & could_down_disrupt(bottom)
+    stable = ordered & rows_stable(bottom)
+    old_bottom_score = rows_sum(bottom)
+
+    assessments = np.empty((n, 27))
+    for s, moves in enumerate(sequences()):
+        score = np.zeros(n, dtype=np.float64)
+        if moves[0] == LEFT:
+            score += np.where(disrupt, weights.left_first, 0)
+        else:
+            score += np.where(disrupt, weights.disrupt_first, 0)
+            if moves[0] == RIGHT:
+                score += np.where(stable, weights.right_first, 0)
+
+        board = boards.copy()
+        gained = np.zeros(n, dtype=np.int64)
+        for move in moves:
+            step_legal = legal_moves(board)[:, move]
+            row = board[:, 3, :]
+            if move == LEFT:
+                bonus = rows_ordered(row) & could_down_disrupt(row)
+                score += np.where(step_legal & bonus, weights.left_step, 0)
+            elif move == RIGHT:
+                score += weights.right_step
+                penalty = rows_ordered(row) & ~rows_stable(row)
+                score += np.where(step_legal & penalty, weights.right_unstable, 0)
+            new_board, step_gained, changed = slide(board, move)
+            board = np.where(step_legal[:, None, None], new_board, board)
+            gained += np.where(step_legal, step_gained, 0)
+            add_random_pieces(board, step_legal, rng)
+
+        bottom_after = board[:, 3, :]
+        score += np.where(rows_ordered(bottom_after), weights.ordered_bottom, 0)
+        score += np.where(largest_in_corner(board), weights.largest_in_corner, 0)
+        total = gained + score + weights.bottom_row * (rows_sum(bottom_after) - old_bottom_score)
+        assessments[:, s] = np.where(legal[:, moves[0]], total, -np.inf)
+    return assessments
+
+def suggest_moves(boards, scores, last_move_up, rng, weights=DEFAULT_WEIGHTS):
+    '''
+    Vectorized Game2048.suggest_move. Returns a suggested direction for every
+    board in the batch and updates last_move_up in place the same way the
+    method updates self.last_move_up.
+
+    Perameters:
+        boards (numpy array (N, 4, 4)): boards to suggest moves for
+        scores (numpy array (N,)): score of each game
+        last_move_up (numpy array (N,)): True where the last suggestion was up
+        rng (numpy Generator): source of random numbers
+        weights (classes2048.HeuristicWeights): weights of the assessment
+
+    Returns:
+        directions (numpy array (N,)): LEFT, RIGHT, UP or DOWN for each board
+    '''
+    n = boards.shape[0]
+    directions = np.full(n, -1, dtype=np.int64)
+    legal = legal_moves(boards)
+
+    # Opening moves are a coin flip between left and down
+    opening = scores < weights.opening_score
+    coin = rng.integers(0, 2, size=n) == 1
+    left_first = np.where(legal[:, LEFT], LEFT, np.where(legal[:, DOWN], DOWN, RIGHT))
+    down_first = np.where(legal[:, DOWN], DOWN, np.where(legal[:, LEFT], LEFT, RIGHT))
+    directions[opening] = np.where(coin, left_first, down_first)[opening]
+
+    # A move up is followed by a move down when possible
+    after_up = ~opening & last_move_up
+    last_move_up[after_up] = False
+    down_reply = after_up & legal[:, DOWN]
+    directions[down_reply] = DOWN
+
+    # An ordered bottom row that is not stable is fixed with a move left
+    pending = directions == -1
+    bottom = boards[:, 3, :]
+    shortcut = pending & rows_ordered(bottom) & ~rows_stable(bottom)
+    directions[shortcut] = LEFT
+
+    pending = directions == -1
+    idx = np.nonzero(pending)[0]
+    if len(idx):
+        assessments = assess_sequences(boards[idx], rng, weights)
+        firsts = np.array([moves[0] for moves in sequences()])
+        best = assessments.argmax(axis=1)
+        found = np.isfinite(assessments[np.arange(len(idx)), best])
+        chosen = np.where(found, firsts[best], UP)
+        directions[idx] = chosen
+        last_move_up[idx[~found]] = True
+    return directions
+
+class BatchGame2048:
+    def __init__(self, num_games, seed=None, weights=DEFAULT_WEIGHTS):
+        '''
+        Creates num_games games of 2048 that are played at the same time.
+        Every game starts with two random pieces.
+
+        Perameters:
+            num_games (int): number of games in the batch
+            seed (int): seed for the random number generator
+            weights (classes2048.HeuristicWeights): weights used to suggest
+                moves
+        '''
+        self.rng = np.random.default_rng(seed)
+        self.weights = weights
+        self.boards = np.zeros((num_games, 4, 4), dtype=np.uint8)
+        self.scores = np.zeros(num_games, dtype=np.int64)
+        self.last_move_up = np.zeros(num_games, dtype=bool)
+        self.active = np.ones(num_games, dtype=bool)
+        self.num_moves = np.zeros(num_games, dtype=np.int64)
+
+        add_random_pieces(self.boards, self.active, self.rng)
+        add_random_pieces(self.boards, self.active, self.rng)
+        self.update_game_over()
+
+    def update_game_over(self):
+        '''
+        Masks out every game that has no possible moves left.
+        '''
+        self.active &= legal_moves(self.boards).any(axis=1)
+
+    def move(self, directions):
+        '''
+        Makes one move in every active game and then adds a random piece to
+        each of them, the same way Game2048.move does.
+
+        Perameters:
+            directions (numpy array (N,)): direction for each game
+        '''
+        for direction in (LEFT, RIGHT, UP, DOWN):
+            idx = np.nonzero(self.active & (directions == direction))[0]
+            if len(idx) == 0:
+                continue
+            new_boards, gained, changed = slide(self.boards[idx], direction)
+            self.boards[idx] = new_boards
+            self.scores[idx] += gained
+        self.num_moves[self.active] += 1
+        add_random_pieces(self.boards, self.active, self.rng)
+        self.update_game_over()
+
+    def step(self):
+        '''
+        Makes the suggested move in every active game.
+        '''
+        idx = np.nonzero(self.active)[0]
+        directions = np.full(len(self.active), -1, dtype=np.int64)
+        last_move_up = self.last_move_up[idx]
+        directions[idx] = suggest_moves(self.boards[idx], self.scores[idx],
+            last_move_up, self.rng, self.weights)
+        self.last_move_up[idx] = last_move_up
+        self.move(directions)
+
+    def play(self):
+        '''
+        Plays every game in the batch until it is over.
+        '''
+        while self.active.any():
+            self.step()
+
+    def largest_pieces(self):
+        '''
+        Returns the value of the largest piece on each board.
+        '''
+        exponents = self.boards.reshape(self.boards.shape[0], 16).max(axis=1)
+        return np.where(exponents != 0, np.left_shift(1, exponents.astype(np.int64)), 0)
+
+def play_games(num_games, batch_size=10000, seed=None, results=None, report=None,
+               weights=DEFAULT_WEIGHTS):
+    '''
+    Plays num_games games in batches of batch_size and returns the top tile
+    of each game.
+
+    Perameters:
+        num_games (int): number of games to play
+        batch_size (int): number of games played at the same time
+        seed (int): seed for the random number generator
+        results (runstats2048.RunStats): if not None, each game is added to
+            it instead of being returned, so memory use doesn't grow with
+            num_games. Games already in results are not played again, so a
+            run can be continued from the results of its first batches.
+        report (function): with results, called with results after each
+            batch, for example to print the results so far. No more batches
+            are played if it returns True.
+        weights (classes2048.HeuristicWeights): weights used to suggest
+            moves
+
+    Returns:
+        top_tiles (list of int): The top value of tiles from each game played,
+            or None if results is given
+    '''
+    seeds = np.random.SeedSequence(seed).spawn((num_games + batch_size - 1) // batch_size)
+    top_tiles = [] if results == None else None
+    first_batch = results.games // batch_size if results != None else 0
+    for i, batch_seed in enumerate(seeds):
+        if i < first_batch:
+            continue
+        size = min(batch_size, num_games - i * batch_size)
+        batch = BatchGame2048(size, batch_seed, weights)
+        batch.play()
+        if results == None:
+            top_tiles.extend(int(tile) for tile in batch.largest_pieces())
+            continue
+
+        # Games in a batch all end together, so they have no time of their own
+        for tile, score, moves in zip(batch.largest_pieces(), batch.scores, batch.num_moves):
+            results.add_game(int(tile), int(score), int(moves))
+        if report != None and report(results):
+            break
+    return top_tiles
@@ -0,0 +1,288 @@
+from classes2048 import Game2048
+from classes2048 import Direction
+from runstats2048 import nearest_rank
+import bitboard2048
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+THRESHOLD = 0.10
+# --quick runs are shorter and so noisier, and are compared more loosely
+QUICK_THRESHOLD = 0.25
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'benchmark_positions.json')
+'''
+File measures how fast the game and the AI in classes2048.py run, so changes
+can be checked for speed as well as for correctness.
+
+The benchmarks are:
+    1. move: moves per second made by Game2048.move with each backend
+    2. is_game_over: microseconds per call, with the saved legal move mask
+       cleared before every call
+    3. suggest_move: latency percentiles (p50, p95, p99) in milliseconds over
+       the fixed positions in benchmark_positions.json
+    4. games: complete seeded games per second played by the AI
+
+Every benchmark is run once before it is timed so lookup tables and caches
+are warm. Every result is taken from the fastest of several rounds to cut
+down on noise from the rest of the machine: throughput from the fastest
+round, and suggest_move latency from the fastest of the rounds for each
+position before the percentiles are taken.
+
+Results are printed as JSON. With --compare, the results are checked against
+a saved baseline and the program exits with status 1 if any benchmark got
+slower by more than --threshold (10%, or 25% with --quick).
+
+The position corpus is checked in so every run measures the same boards. It
+can be rebuilt with --make-corpus.
+'''
+
+def percentile(values, fraction):
+    '''
+    Returns a percentile of a list of numbers using the nearest rank (see
+    "nearest_rank" in runstats2048.py).
+
+    Perameters:
+        values (list of float): the measurements
+        fraction (float): which percentile, e.g. 0.99 for p99
+
+    Returns:
+        (float): the percentile
+    '''
+    ordered = sorted(values)
+    return ordered[nearest_rank(fraction, len(ordered)) - 1]
+
+def load_corpus(path=CORPUS_FILE):
+    '''
+    Loads the benchmark positions.
+
+    Returns:
+        (list of dict): positions with a 'board' and a 'score'
+    '''
+    with open(path) as f:
+        return json.load(f)['positions']
+
+def make_corpus(path=CORPUS_FILE, num_games=10, every=50, seed=2048):
+    '''
+    Plays seeded games and saves every few positions to the corpus file, so
+    the corpus covers the opening, middle and end of games.
+
+    Perameters:
+        path (str): file to write
+        num_games (int): number of games to take positions from
+        every (int): number of moves between saved positions
+        seed (int): seed for the games
+    '''
+    positions = []
+    for i in range(num_games):
+        game = Game2048('bitboard', random.Random(str(seed) + ':' + str(i)))
+        game.add_random_piece(game.board)
+        game.add_random_piece(game.board)
+        moves = 0
+        while not game.is_game_over():
+            if moves % every == 0:
+                positions.append({'board': game.copy_board(), 'score': game.score})
+            game.move(game.suggest_move(), game.board)
+            moves += 1
+
+    # One position per line keeps the file small and easy to diff
+    with open(path, 'w') as f:
+        f.write('{"seed": ' + str(seed) + ', "positions": [\n')
+        f.write(',\n'.join(json.dumps(position) for position in positions))
+        f.write('\n]}\n')
+
+def bench_moves(positions, backend, repeat):
+    '''
+    Returns the number of moves per second made by Game2048.move in the
+    fastest of repeat rounds.
+    '''
+    game = Game2048(backend, random.Random(0))
+    boards = []
+    for position in positions:
+        for direction in Direction:
+            if game.is_move_possible(direction, position['board']):
+                boards.append((position['board'], direction))
+
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        for board, direction in boards:
+            game.move(direction, [row.copy() for row in board])
+        elapsed = time.perf_counter() - start
+        if best == None or elapsed < best:
+            best = elapsed
+    return len(boards) / best
+
+def bench_game_over(positions, repeat):
+    '''
+    Returns the number of microseconds per call to Game2048.is_game_over
+    in the fastest of repeat rounds.
+    '''
+    games = []
+    for position in positions:
+        game = Game2048()
+        game.board = [row.copy() for row in position['board']]
+        games.append(game)
+
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        for game in games:
+            game.board_changed()
+            game.is_game_over()
+        elapsed = time.perf_counter() - start
+        if best == None or elapsed < best:
+            best = elapsed
+    return best / len(games) * 1e6
+
+def bench_suggest_move(positions, repeat):
+    '''
+    Returns the suggest_move latency in milliseconds for every position,
+    each the fastest of repeat rounds.
+    '''
+    latencies = [None] * len(positions)
+    for i in range(repeat):
+        for j, position in enumerate(positions):
+            game = Game2048('bitboard', random.Random(j))
+            game.board = [row.copy() for row in position['board']]
+            game.score = position['score']
+            start = time.perf_counter()
+            game.suggest_move()
+            elapsed = (time.perf_counter() - start) * 1000
+            if latencies[j] == None or elapsed < latencies[j]:
+                latencies[j] = elapsed
+    return latencies
+
+def bench_games(num_games, seed, repeat):
+    '''
+    Returns the number of complete seeded games played per second in the
+    fastest of repeat rounds. Every round plays the same games.
+    '''
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        for j in range(num_games):
+            game = Game2048('bitboard', random.Random(str(seed) + ':' + str(j)))
+            game.add_random_piece(game.board)
+            game.add_random_piece(game.board)
+            while not game.is_game_over():
+                game.move(game.suggest_move(), game.board)
+        elapsed = time.perf_counter() - start
+        if best == None or elapsed < best:
+            best = elapsed
+    return num_games / best
+
+def run_benchmarks(positions, quick=False):
+    '''
+    Runs every benchmark.
+
+    Perameters:
+        positions (list of dict): the position corpus
+        quick (bool): use fewer repeats, for a fast rough check
+
+    Returns:
+        (dict): benchmark results
+    '''
+    repeat = 3 if quick else 5
+    num_games = 2 if quick else 5
+
+    # Warm up the lookup tables and caches
+    bitboard2048.build_tables()
+    bench_suggest_move(positions, 1)
+    bench_moves(positions, 'list', 1)
+    bench_moves(positions, 'bitboard', 1)
+
+    latencies = bench_suggest_move(positions, repeat)
+    metrics = {
+        'move_list_per_sec': bench_moves(positions, 'list', repeat * 2),
+        'move_bitboard_per_sec': bench_moves(positions, 'bitboard', repeat * 2),
+        'is_game_over_us': bench_game_over(positions, repeat * 10),
+        'suggest_move_p50_ms': percentile(latencies, 0.50),
+        'suggest_move_p95_ms': percentile(latencies, 0.95),
+        'suggest_move_p99_ms': percentile(latencies, 0.99),
+        'games_per_sec': bench_games(num_games, 0, repeat),
+    }
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'positions': len(positions),
+        'metrics': metrics,
+    }
+
+def compare(results, baseline, threshold):
+    '''
+    Compares results against a baseline. Metrics ending in '_per_sec' are
+    better when higher, the rest are better when lower.
+
+    Perameters:
+        results (dict): results of this run
+        baseline (dict): saved results to compare against
+        threshold (float): allowed slowdown, e.g. 0.1 for 10%
+
+    Returns:
+        regressions (list of str): names of the metrics that got slower
+    '''
+    regressions = []
+    for name, value in results['metrics'].items():
+        old_value = baseline['metrics'].get(name)
+        if old_value == None or old_value == 0:
+            continue
+        if name.endswith('_per_sec'):
+            change = (old_value - value) / old_value
+        else:
+            change = (value - old_value) / old_value
+        status = 'ok'
+        if change > threshold:
+            status = 'REGRESSION'
+            regressions.append(name)
+        if change > 0:
+            description = str(round(change * 100, 1)) + '% slower'
+        else:
+            description = str(round(-change * 100, 1)) + '% faster'
+        print(name + ':', round(old_value, 4), '->', round(value, 4),
+              '(' + description + ')', status, file=sys.stderr)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the 2048 engine and AI.')
+    parser.add_argument('--output', default=None,
+                        help='file to write the JSON results to (default: standard output)')
+    parser.add_argument('--compare', default=None,
+                        help='baseline JSON results to check for regressions')
+    parser.add_argument('--threshold', type=float, default=None,
+                        help='slowdown allowed by --compare (default: ' + str(THRESHOLD) +
+                             ', or ' + str(QUICK_THRESHOLD) + ' with --quick)')
+    parser.add_argument('--quick', action='store_true',
+                        help='fewer repeats, for a fast rough check')
+    parser.add_argument('--corpus', default=CORPUS_FILE,
+                        help='position corpus to use')
+    parser.add_argument('--make-corpus', action='store_true',
+                        help='rebuild the position corpus and exit')
+    args = parser.parse_args()
+
+    if args.make_corpus:
+        make_corpus(args.corpus)
+        return
+
+    results = run_benchmarks(load_corpus(args.corpus), args.quick)
+    text = json.dumps(results, indent=2)
+    if args.output != None:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare != None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        threshold = args.threshold
+        if threshold == None:
+            threshold = QUICK_THRESHOLD if args.quick else THRESHOLD
+        if compare(results, baseline, threshold):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+'''
+This file contains a bitboard representation of a 2048 board. The 16 cells
+of the board are packed into a single 64 bit integer where every cell takes
+up 4 bits and stores the exponent of the tile (a 2 is stored as 1, a 4 as 2,
+and so on). Empty cells are stored as 0.
+
+The cell at (row, col) is stored at bit 16 * row + 4 * col, so each row of
+the board is one 16 bit number with the leftmost tile in the lowest 4 bits.
+
+Moves are made with lookups into tables that hold the result of a left or
+right move for every one of the 65536 possible rows. Up and down moves are
+made by transposing the board so that columns become rows. The tables are
+built the first time a move is made, so importing this file is cheap.
+
+The largest tile that can be stored is 32768 (2 ** 15). Combining two
+32768 tiles raises a ValueError instead of making a tile that can't be
+stored.
+'''
+
+ROW_MASK = 0xFFFF
+COL_MASK = 0x000F000F000F000F
+
+# Score stored in the score tables for rows where two 32768 tiles combine.
+# It is larger than the points any move can gain, so apply_rows can check
+# for it with a single comparison.
+OVERFLOW_SCORE = 1 << 20
+
+# Lookup tables indexed by a 16 bit row. They are filled by build_tables.
+ROW_LEFT = []
+ROW_RIGHT = []
+SCORE_LEFT = []
+SCORE_RIGHT = []
+
+def slide_row_left(cells):
+    '''
+    Slides and combines a row of exponents to the left according to the
+    rules of 2048.
+
+    Perameters:
+        cells (list of int): 4 exponents, 0 for an empty cell
+
+    Returns:
+        (tuple: (list of int, int)): the new row and the points gained
+
+    Raises:
+        ValueError: if two 32768 tiles combine
+    '''
+    tiles = [cell for cell in cells if cell != 0]
+    result = []
+    score = 0
+    i = 0
+    while i < len(tiles):
+        if i + 1 < len(tiles) and tiles[i] == tiles[i + 1]:
+            exponent = tiles[i] + 1
+            if exponent > 15:
+                raise ValueError('tile ' + str(1 << exponent) + ' is too large for a bitboard')
+            result.append(exponent)
+            score += 1 << exponent
+            i += 2
+        else:
+            result.append(tiles[i])
+            i += 1
+    while len(result) < 4:
+        result.append(0)
+    return result, score
+
+def row_to_cells(row):
+    '''
+    Unpacks a 16 bit row into a list of 4 exponents (leftmost first).
+    '''
+    return [(row >> 4 * i) & 0xF for i in range(4)]
+
+def cells_to_row(cells):
+    '''
+    Packs a list of 4 exponents (leftmost first) into a 16 bit row.
+    '''
+    return cells[0] | (cells[1] << 4) | (cells[2] << 8) | (cells[3] << 12)
+
+def build_tables():
+    '''
+    Fills the row lookup tables. Does nothing if the tables were already
+    built.
+    '''
+    if ROW_LEFT:
+        return
+
+    row_left = [0] * 65536
+    row_right = [0] * 65536
+    score_left = [0] * 65536
+    score_right = [0] * 65536
+
+    for row in range(65536):
+        cells = row_to_cells(row)
+
+        try:
+            left, score = slide_row_left(cells)
+            row_left[row] = cells_to_row(left)
+            score_left[row] = score
+        except ValueError:
+            row_left[row] = row
+            score_left[row] = OVERFLOW_SCORE
+
+        try:
+            right, score = slide_row_left(cells[::-1])
+            row_right[row] = cells_to_row(right[::-1])
+            score_right[row] = score
+        except ValueError:
+            row_right[row] = row
+            score_right[row] = OVERFLOW_SCORE
+
+    ROW_LEFT.extend(row_left)
+    ROW_RIGHT.extend(row_right)
+    SCORE_LEFT.extend(score_left)
+    SCORE_RIGHT.extend(score_right)
+
+def encode(board):
+    '''
+    Packs a list of list 2048 board into a 64 bit integer.
+
+    Perameters:
+        board (list of list): 2048 board to be packed
+
+    Returns:
+        bits (int): the packed board
+    '''
+    bits = 0
+    shift = 0
+    for row in board:
+        for num in row:
+            if num != None:
+                exponent = num.bit_length() - 1
+                if exponent > 15:
+                    raise ValueError('tile ' + str(num) + ' is too large for a bitboard')
+                bits |= exponent << shift
+            shift += 4
+    return bits
+
+def decode(bits):
+    '''
+    Unpacks a 64 bit integer into a new list of list 2048 board.
+
+    Perameters:
+        bits (int): the packed board
+
+    Returns:
+        board (list of list): the unpacked board
+    '''
+    board = [[None, None, None, None],
+             [None, None, None, None],
+             [None, None, None, None],
+             [None, None, None, None]]
+    write_board(bits, board)
+    return board
+
+def write_board(bits, board):
+    '''
+    Writes a packed board into an existing list of list board in place.
+
+    Perameters:
+        bits (int): the packed board
+        board (list of list): 2048 board that is overwritten
+    '''
+    for row in board:
+        for j in range(4):
+            exponent = bits & 0xF
+            row[j] = (1 << exponent) if exponent else None
+            bits >>= 4
+
+def transpose(bits):
+    '''
+    Returns the packed board with rows and columns swapped.
+    '''
+    a1 = bits & 0xF0F00F0FF0F00F0F
+    a2 = bits & 0x0000F0F00000F0F0
+    a3 = bits & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+def apply_rows(bits, rows, scores):
+    '''
+    Applies a row table to every row of a packed board.
+
+    Perameters:
+        bits (int): the packed board
+        rows (list of int): row table (ROW_LEFT or ROW_RIGHT)
+        scores (list of int): matching score table
+
+    Returns:
+        (tuple: (int, int)): the new packed board and the points gained
+
+    Raises:
+        ValueError: if two 32768 tiles combine
+    '''
+    r0 = bits & ROW_MASK
+    r1 = (bits >> 16) & ROW_MASK
+    r2 = (bits >> 32) & ROW_MASK
+    r3 = bits >> 48
+    new_bits = rows[r0] | (rows[r1] << 16) | (rows[r2] << 32) | (rows[r3] << 48)
+    score = scores[r0] + scores[r1] + scores[r2] + scores[r3]
+    if score >= OVERFLOW_SCORE:
+        raise ValueError('tile 65536 is too large for a bitboard')
+    return new_bits, score
+
+def move_left(bits):
+    '''
+    Returns (new_bits, score_gained) for a left move. Does not add a
+    random piece.
+    '''
+    build_tables()
+    return apply_rows(bits, ROW_LEFT, SCORE_LEFT)
+
+def move_right(bits):
+    '''
+    Returns (new_bits, score_gained) for a right move. Does not add a
+    random piece.
+    '''
+    build_tables()
+    return apply_rows(bits, ROW_RIGHT, SCORE_RIGHT)
+
+def move_up(bits):
+    '''
+    Returns (new_bits, score_gained) for an up move. Does not add a
+    random piece.
+    '''
+    build_tables()
+    new_bits, score = apply_rows(transpose(bits), ROW_LEFT, SCORE_LEFT)
+    return transpose(new_bits), score
+
+def move_down(bits):
+    '''
+    Returns (new_bits, score_gained) for a down move. Does not add a
+    random piece.
+    '''
+    build_tables()
+    new_bits, score = apply_rows(transpose(bits), ROW_RIGHT, SCORE_RIGHT)
+    return transpose(new_bits), score
@@ -1,19 +1,817 @@
 from enum import Enum
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import random
+import time
 import logging
-import itertools
+import bitboard2048
+import expectimax2048
 
 Direction = Enum('Direction', ['LEFT', 'RIGHT', 'UP', 'DOWN'])
 Combination_Direction = Enum('Combination_Direction', ['Horizontal', 'Vertical'])
 Board_Section = Enum('Board_Section', ['bottom_l, bottom_r, top_l, top_r'])
 
-class Game2048:
+# Boards can either be updated in place cell by cell ('list') or packed into
+# a 64 bit integer and updated with lookup tables ('bitboard'). Both give the
+# same results.
+BACKENDS = ('list', 'bitboard')
+
+BITBOARD_MOVES = {
+    Direction.LEFT: bitboard2048.move_left,
+    Direction.RIGHT: bitboard2048.move_right,
+    Direction.UP: bitboard2048.move_up,
+    Direction.DOWN: bitboard2048.move_down,
+}
+
+# Moves searched by suggest_move, in the order they are tried. Moving up is
+# generally poor strategy so it is left out.
+SEARCH_MOVES = {
+    'D': Direction.DOWN,
+    'L': Direction.LEFT,
+    'R': Direction.RIGHT,
+}
+
+# Number of moves in the sequences searched by suggest_move
+SEARCH_DEPTH = 3
+
+# Deepest search suggest_move tries when it is given a deadline
+MAX_SEARCH_DEPTH = 8
+
+# Results of sliding a row to the left or to the right, keyed by the row.
+# There are only so many different rows, so these stay small.
+LEFT_ROWS = {}
+RIGHT_ROWS = {}
+
+def freeze_board(board):
+    '''
+    Returns an immutable copy of a board, where every row is a tuple. Boards
+    like this are used by "transition" and can be shared safely.
+
+    Perameters:
+        board (list of list): 2048 board to copy
+
+    Returns:
+        (tuple of tuple): the immutable board
+    '''
+    return tuple(tuple(row) for row in board)
+
+def slide_row(row, direction):
+    '''
+    Slides and combines one row (or column) according to the rules of 2048.
+
+    Perameters:
+        row (tuple): 4 tiles, None for an empty space
+        direction (Enum (Direction)): Direction.LEFT to slide towards the
+            start of the row or Direction.RIGHT to slide towards the end
+
+    Returns:
+        (tuple: (tuple, int, boolean)): the new row, the points scored and
+            whether the row changed
+    '''
+    rows = LEFT_ROWS if direction == Direction.LEFT else RIGHT_ROWS
+    result = rows.get(row)
+    if result != None:
+        return result
+
+    tiles = [num for num in row if num != None]
+    if direction == Direction.RIGHT:
+        tiles.reverse()
+    new_row = []
+    score = 0
+    i = 0
+    while i < len(tiles):
+        if i + 1 < len(tiles) and tiles[i] == tiles[i + 1]:
+            new_row.append(tiles[i] * 2)
+            score += tiles[i] * 2
+            i += 2
+        else:
+            new_row.append(tiles[i])
+            i += 1
+    new_row += [None] * (4 - len(new_row))
+    if direction == Direction.RIGHT:
+        new_row.reverse()
+    new_row = tuple(new_row)
+
+    result = (new_row, score, new_row != row)
+    rows[row] = result
+    return result
+
+def transition(board, direction):
+    '''
+    Returns the result of a move on an immutable board without adding a
+    random piece. The board passed in is not changed and no Game2048 is
+    needed. Rows that the move doesn't change are shared with the old board
+    instead of being copied, and if nothing changes the old board itself is
+    returned.
+
+    Perameters:
+        board (tuple of tuple): immutable 2048 board (see "freeze_board")
+        direction (Enum (Direction)): Direction of the move
+
+    Returns:
+        (tuple: (tuple of tuple, int, boolean)): the new board, the points
+            scored by the move and whether the board changed
+    '''
+    if direction == Direction.LEFT or direction == Direction.RIGHT:
+        new_rows = []
+        score = 0
+        changed = False
+        for row in board:
+            new_row, row_score, row_changed = slide_row(row, direction)
+            if row_changed:
+                new_rows.append(new_row)
+                score += row_score
+                changed = True
+            else:
+                new_rows.append(row)
+        if not changed:
+            return board, 0, False
+        return tuple(new_rows), score, True
+
+    # Columns are slid the same way as rows, up like left and down like right
+    row_direction = Direction.LEFT if direction == Direction.UP else Direction.RIGHT
+    new_columns = []
+    score = 0
+    changed = False
+    for column in zip(*board):
+        new_column, column_score, column_changed = slide_row(column, row_direction)
+        new_columns.append(new_column)
+        score += column_score
+        changed = changed or column_changed
+    if not changed:
+        return board, 0, False
+
+    new_rows = []
+    for old_row, new_row in zip(board, zip(*new_columns)):
+        new_rows.append(old_row if old_row == new_row else new_row)
+    return tuple(new_rows), score, True
+
+def choose_random_piece(board, rng):
+    '''
+    Chooses where a random piece is added and what it is. Every empty space
+    is equally likely, and the piece is a four 10% of the time and a two
+    otherwise.
+
+    Perameters:
+        board (list of list): 2048 board the piece is added to
+        rng (random.Random): Source of random numbers
+
+    Returns:
+        (tuple: (int, tuple: (int, int))): the piece and its location
+            (row, col), or None if there are no empty spaces
+    '''
+    # The same 17 random numbers are drawn whatever the board: one for the
+    # piece and a key for each of the 16 spaces. The piece goes in the empty
+    # space with the largest key, which is equally likely to be any of them.
+    # Two games with the same seed then get the same twos and fours in the
+    # same order, and often the same space even once their boards differ.
+    piece_num = 4 if rng.random() < 0.1 else 2
+    random_key = rng.random
+    loc = None
+    best_key = -1.0
+    for i in range(4):
+        row = board[i]
+        for j in range(4):
+            key = random_key()
+            if key > best_key and row[j] == None:
+                loc = (i, j)
+                best_key = key
+    if loc == None:
+        return None
+    return piece_num, loc
+
+def with_random_piece(board, rng):
+    '''
+    Returns a copy of an immutable board with a random piece added. Only the
+    row that gets the piece is copied. The piece is chosen the same way as in
+    "choose_random_piece", but with a single random number: this is used
+    by the lookahead, which draws from the AI's own generator and so gains
+    nothing from keeping the pieces of two games in step.
+
+    Perameters:
+        board (tuple of tuple): immutable 2048 board
+        rng (random.Random): Source of random numbers
+
+    Returns:
+        (tuple of tuple): the new board
+    '''
+    empty = [(i, j) for i in range(4) for j in range(4) if board[i][j] == None]
+    if not empty:
+        return board
+
+    # There are 10 equally likely outcomes for every empty space and one of
+    # them is a four
+    draw = int(rng.random() * len(empty) * 10)
+    piece_num = 4 if draw % 10 == 0 else 2
+    row, col = empty[draw // 10]
+    new_row = board[row][:col] + (piece_num,) + board[row][col + 1:]
+    return board[:row] + (new_row,) + board[row + 1:]
+
+# Properties of rows used to assess sequences of moves, keyed by the row. A
+# row's properties are worked out the first time the row is seen, so nothing
+# is computed until the AI is used.
+ROW_PROPERTIES = {}
+
+def row_properties(row):
+    '''
+    Returns the properties of a row that the lookahead uses to assess boards.
+    They are the same as the results of Game2048.is_row_ordered,
+    Game2048.is_row_stable, Game2048.could_down_distrupt_bottom and
+    Game2048.bottom_row_score for the row.
+
+    Perameters:
+        row (tuple): 4 tiles, None for an empty space
+
+    Returns:
+        (tuple: (boolean, boolean, boolean, int, int, boolean)): whether the
+            row is ordered, whether it is stable, whether a down move could
+            distrupt it (as the bottom row), the sum of its tiles, its largest
+            tile (0 if it is empty) and whether its first tile is the largest
+            and the first largest one
+    '''
+    properties = ROW_PROPERTIES.get(row)
+    if properties != None:
+        return properties
+
+    ordered = True
+    last_piece = None
+    for num in row:
+        if last_piece != None and num != None and num > last_piece:
+            ordered = False
+        if num != None:
+            last_piece = num
+
+    stable = None not in row and row[0] != row[1] and row[1] != row[2] and row[2] != row[3]
+
+    could_distrupt = False
+    for i in range(1, 4):
+        if row[i] != None and row[i - 1] == None:
+            could_distrupt = True
+
+    tiles = [num for num in row if num != None]
+    total = sum(tiles)
+    largest = max(tiles) if tiles else 0
+    largest_first = row[0] != None and row[0] == largest
+
+    properties = (ordered, stable, could_distrupt, total, largest, largest_first)
+    ROW_PROPERTIES[row] = properties
+    return properties
+
+def is_largest_in_corner(board):
+    '''
+    Returns True if the largest piece on the board is in the bottom left
+    corner, the same as Game2048.loc_largest_piece(board) == (3, 0).
+
+    Perameters:
+        board (tuple of tuple): immutable 2048 board
+
+    Returns:
+        (boolean): True if the largest piece is at (3, 0)
+    '''
+    bottom = row_properties(board[3])
+    if not bottom[5]:
+        return False
+
+    # loc_largest_piece finds the first largest piece, so every piece above
+    # the bottom row has to be smaller.
+    return (bottom[4] > row_properties(board[0])[4] and
+            bottom[4] > row_properties(board[1])[4] and
+            bottom[4] > row_properties(board[2])[4])
+
+# Bit for each direction in a legal move mask (see "legal_move_mask")
+MOVE_BITS = {
+    Direction.LEFT: 1,
+    Direction.RIGHT: 2,
+    Direction.UP: 4,
+    Direction.DOWN: 8,
+}
+ALL_MOVES = 15
+
+def legal_move_mask(board):
+    '''
+    Returns a mask of the moves that are possible on a board, found in a
+    single pass over neighbouring pairs of tiles. The mask has the bit from
+    MOVE_BITS set for every direction that would change the board.
+
+    Perameters:
+        board (list of list): 2048 board the function checks
+
+    Returns:
+        mask (int): the legal move mask, 0 if the game is over
+    '''
+    mask = 0
+    for i in range(4):
+        row = board[i]
+        for j in range(3):
+            # Pair of tiles next to each other in a row
+            left = row[j]
+            right = row[j + 1]
+            if left != None:
+                if right == None:
+                    mask |= 2
+                elif left == right:
+                    mask |= 3
+            elif right != None:
+                mask |= 1
+
+            # Pair of tiles next to each other in a column
+            top = board[j][i]
+            below = board[j + 1][i]
+            if top != None:
+                if below == None:
+                    mask |= 8
+                elif top == below:
+                    mask |= 12
+            elif below != None:
+                mask |= 4
+        if mask == ALL_MOVES:
+            break
+    return mask
+
+class SearchTimeout(Exception):
+    '''
+    Raised inside the lookahead search when its deadline has passed.
+    '''
+
+# Pool of processes used by suggest_move(workers=...). It is created the
+# first time it is needed and kept so later searches don't have to start new
+# processes.
+search_pool = None
+search_pool_workers = 0
+
+def get_search_pool(workers):
+    '''
+    Returns the shared pool of search processes, creating it (or replacing it
+    if it has a different number of workers) when needed.
+
+    Perameters:
+        workers (int): number of worker processes
+
+    Returns:
+        (ProcessPoolExecutor): the shared pool
+    '''
+    global search_pool, search_pool_workers
+    if search_pool != None and search_pool_workers != workers:
+        shutdown_search_pool()
+    if search_pool == None:
+        search_pool = ProcessPoolExecutor(workers)
+        search_pool_workers = workers
+    return search_pool
+
+def shutdown_search_pool():
+    '''
+    Stops the shared pool of search processes, if there is one.
+    '''
+    global search_pool, search_pool_workers
+    if search_pool != None:
+        search_pool.shutdown()
+        search_pool = None
+        search_pool_workers = 0
+
+def search_subtree(task):
+    '''
+    Searches the part of the lookahead tree below one pair of first and
+    second moves. Used by Game2048.search_tree, either directly or in a
+    worker process.
+
+    Perameters:
+        task (tuple): (board, move, score, moves_left, old_bottom_row_score,
+            seed, deadline, collect_stats, weights), where board is the immutable
+            board after the first move, move is the second move, score is the
+            weight given to the first move, deadline is the
+            time.perf_counter() value after which the search stops, or None
+            for no deadline, and collect_stats says whether to count the work
+            done (see SearchStats). time.perf_counter() uses a system wide
+            clock, so the deadline means the same thing in every worker
+            process. weights are the HeuristicWeights of the search.
+
+    Returns:
+        (tuple: (int, dict)): The best assessment in the subtree, or None if
+            the search ran out of time, and the counts of the work done, or
+            None if collect_stats is False
+    '''
+    (board, move, score, moves_left, old_bottom_row_score, seed, deadline, collect_stats,
+     weights) = task
+    game = Game2048(weights=weights)
+    if collect_stats:
+        game.stats = SearchStats()
+    rng = random.Random(seed)
+    step_score, new_board = game.expand_move(move, board, rng)
+    try:
+        value = game.best_sequence_score(new_board, moves_left - 1,
+            score + step_score, old_bottom_row_score, rng, deadline)
+    except SearchTimeout:
+        value = None
+    if collect_stats:
+        return value, game.stats.call
+    return value, None
+
+def suggest_position(task):
+    '''
+    Suggests a move for one position without needing a Game2048. Can be run
+    in a worker process.
+
+    Perameters:
+        task (tuple): (board, score, last_move_up, seed), where seed seeds
+            the random numbers used by the AI
+
+    Returns:
+        (tuple: (Direction, boolean)): the suggested direction and the new
+            value of last_move_up
+    '''
+    return suggest_positions([task])[0]
+
+def suggest_positions(tasks):
+    '''
+    Suggests a move for each of a list of positions (see
+    "suggest_position"). One Game2048 is reused for every position.
+
+    Returns:
+        (list of tuple: (Direction, boolean)): the suggested direction and
+            the new value of last_move_up for each position
+    '''
+    rng = random.Random()
+    game = Game2048('bitboard', rng)
+    results = []
+    for board, score, last_move_up, seed in tasks:
+        rng.seed(seed)
+        game.board = [list(row) for row in board]
+        game.score = score
+        game.last_move_up = last_move_up
+        results.append((game.suggest_move(), game.last_move_up))
+    return results
+
+def suggest_moves_batch(boards, scores, last_move_up, rng=None, workers=None):
+    '''
+    Suggests a move for each of many boards in one call. Boards that are
+    the same, with the same last_move_up and on the same side of the opening
+    (a score below 300), get the same suggestion, so each different position
+    is only searched once. With workers, the positions are split between the
+    shared pool of search processes, a chunk at a time.
+
+    The suggestions are the ones Game2048.suggest_move would make. As with
+    suggest_move, the new value of last_move_up is the same as before while
+    the score is below 300, and after that it is True only if the suggested
+    move is Direction.UP.
+
+    Perameters:
+        boards (list of list of list): 2048 boards
+        scores (list of int): score of each game
+        last_move_up (list of boolean): whether the last move in each game
+            was up
+        rng (random.Random): Source of the random numbers used by the AI.
+            Uses the global random module if None.
+        workers (int): Number of processes to search with, or None to
+            search in this process.
+
+    Returns:
+        (list of Direction): the suggested move for each board, in order
+    '''
+    if rng == None:
+        rng = random
+    positions = {}
+    tasks = []
+    keys = []
+    for board, score, up in zip(boards, scores, last_move_up):
+        frozen = freeze_board(board)
+        key = (frozen, bool(up), score < DEFAULT_WEIGHTS.opening_score)
+        if key not in positions:
+            positions[key] = len(tasks)
+            tasks.append((frozen, score, bool(up), rng.getrandbits(32)))
+        keys.append(positions[key])
+
+    if workers == None or len(tasks) < 2:
+        results = suggest_positions(tasks)
+    else:
+        # Chunks big enough that sending them to the workers costs little
+        # next to the searches, and enough of them to share out evenly
+        size = max(1, len(tasks) // (workers * 4))
+        chunks = [tasks[i:i + size] for i in range(0, len(tasks), size)]
+        results = []
+        for chunk_results in get_search_pool(workers).map(suggest_positions, chunks):
+            results.extend(chunk_results)
+
+    return [results[index][0] for index in keys]
+
+class EvaluationCache:
+    def __init__(self, max_size=100000):
+        '''
+        Creates a cache of suggested moves for board positions. When the
+        cache is full, the least recently used position is evicted. The same
+        cache can be shared by every Game2048 in a process.
+
+        Perameters:
+            max_size (int): The most positions the cache holds at once
+        '''
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1')
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        '''
+        Returns the value stored for key, or None if key is not in the cache.
+
+        Perameters:
+            key (hashable): The key the value was stored under
+        '''
+        value = self.entries.get(key)
+        if value == None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        '''
+        Stores value under key, evicting the least recently used entry if the
+        cache is full.
+
+        Perameters:
+            key (hashable): The key to store the value under
+            value (object): The value to store, must not be None
+        '''
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        '''
+        Removes every entry from the cache and resets the counters.
+        '''
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        '''
+        Returns the cache counters.
+
+        Returns:
+            (dict): size, max_size, hits, misses and evictions
+        '''
+        return {
+            'size': len(self.entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+# Ways suggest_move can choose a move, counted by SearchStats
+SUGGEST_BRANCHES = ('opening', 'down_reply', 'left_shortcut', 'cache_hit',
+                    'search', 'expectimax')
+
+# Work counted by SearchStats during each call to suggest_move:
+#     sequences: sequences of moves scored at the bottom of the lookahead
+#     nodes: moves tried by the lookahead (or expectimax nodes)
+#     moves: moves that changed a board in the lookahead
+#     copies: boards built by the lookahead
+#     ordered_hits, corner_hits: scored sequences that got the ordered bottom
+#         row bonus and the largest piece in the corner bonus
+#     row_seconds, corner_seconds: time spent on those two heuristics
+SEARCH_COUNTS = ('sequences', 'nodes', 'moves', 'copies', 'ordered_hits',
+                 'corner_hits', 'row_seconds', 'corner_seconds')
+
+def new_search_counts():
+    '''
+    Returns a dict with every name in SEARCH_COUNTS set to 0.
+    '''
+    return dict.fromkeys(SEARCH_COUNTS, 0)
+
+class SearchStats:
     def __init__(self):
         '''
-        Creates a game of 2048
+        Creates a set of counters and timings for suggest_move. Attach it to a
+        game with Game2048(stats=...) and it is updated on every call, both
+        for the last call (self.call) and for all the calls so far
+        (self.totals). Games without stats don't pay for any of this.
+        '''
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.branches = dict.fromkeys(SUGGEST_BRANCHES, 0)
+        self.totals = new_search_counts()
+        self.call = new_search_counts()
+        self.last_branch = None
+        self.last_seconds = 0.0
+        self.last_depth = 0
+
+    def start_call(self):
+        '''
+        Clears the counts of the last call before a new call starts.
+        '''
+        self.call = new_search_counts()
+
+    def add(self, counts):
+        '''
+        Adds counts (a dict like self.call) to the counts of the current
+        call. Used for work done in other processes.
+        '''
+        call = self.call
+        for name in SEARCH_COUNTS:
+            call[name] += counts[name]
+
+    def end_call(self, branch, seconds, depth):
+        '''
+        Records the end of a call to suggest_move.
+
+        Perameters:
+            branch (str): how the move was chosen, one of SUGGEST_BRANCHES
+            seconds (float): how long the call took
+            depth (int): search depth reached, 0 without a search
+        '''
+        self.calls += 1
+        self.seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+        self.branches[branch] += 1
+        for name in SEARCH_COUNTS:
+            self.totals[name] += self.call[name]
+        self.last_branch = branch
+        self.last_seconds = seconds
+        self.last_depth = depth
+
+    def merge(self, other):
+        '''
+        Adds the totals of another SearchStats to this one, for example to
+        combine the stats of several games.
+        '''
+        self.calls += other.calls
+        self.seconds += other.seconds
+        self.max_seconds = max(self.max_seconds, other.max_seconds)
+        for branch in SUGGEST_BRANCHES:
+            self.branches[branch] += other.branches[branch]
+        for name in SEARCH_COUNTS:
+            self.totals[name] += other.totals[name]
+
+    def to_dict(self):
+        '''
+        Returns the stats as a dict that can be written as JSON.
+
+        Returns:
+            (dict): calls, total and per call times, the count of each
+                branch, the total counts, the heuristic hit rates and the
+                counts of the last call
+        '''
+        sequences = self.totals['sequences']
+        return {
+            'calls': self.calls,
+            'seconds': self.seconds,
+            'mean_ms': self.seconds / self.calls * 1000 if self.calls else 0.0,
+            'max_ms': self.max_seconds * 1000,
+            'branches': dict(self.branches),
+            'counts': dict(self.totals),
+            'ordered_hit_rate': self.totals['ordered_hits'] / sequences if sequences else 0.0,
+            'corner_hit_rate': self.totals['corner_hits'] / sequences if sequences else 0.0,
+            'last': {
+                'branch': self.last_branch,
+                'ms': self.last_seconds * 1000,
+                'depth': self.last_depth,
+                'counts': dict(self.call),
+            },
+        }
+
+# Weights given by the AI's assessment of a sequence of moves, in the order
+# taken by HeuristicWeights
+WEIGHT_NAMES = ('left_first', 'disrupt_first', 'right_first', 'left_step',
+                'right_step', 'right_unstable', 'ordered_bottom',
+                'largest_in_corner', 'bottom_row', 'opening_score')
+
+class HeuristicWeights:
+    def __init__(self, left_first=1000, disrupt_first=-200, right_first=8,
+                 left_step=100, right_step=-4, right_unstable=-5000,
+                 ordered_bottom=1000, largest_in_corner=10000, bottom_row=4,
+                 opening_score=300):
+        '''
+        Creates the weights used by suggest_move to assess sequences of
+        moves. The defaults are the weights the AI has always used. Weights
+        that are equal compare equal, so they can be part of a cache key.
+
+        Perameters:
+            left_first (int): added if the first move is left and the bottom
+                row is ordered but could be distrupted by a move down
+            disrupt_first (int): added if the first move is down or right
+                and the bottom row could be distrupted in the same way
+            right_first (int): added if the first move is right and the
+                bottom row is ordered and stable
+            left_step (int): added for every left move made while the bottom
+                row could be distrupted
+            right_step (int): added for every right move in the sequence
+            right_unstable (int): added for every right move made while the
+                bottom row is ordered but not stable
+            ordered_bottom (int): added if the bottom row is ordered at the
+                end of the sequence
+            largest_in_corner (int): added if the largest piece is in the
+                bottom left corner at the end of the sequence
+            bottom_row (int): weight of the change in the sum of the bottom
+                row
+            opening_score (int): score below which the opening moves are
+                used instead of a search
+        '''
+        self.left_first = left_first
+        self.disrupt_first = disrupt_first
+        self.right_first = right_first
+        self.left_step = left_step
+        self.right_step = right_step
+        self.right_unstable = right_unstable
+        self.ordered_bottom = ordered_bottom
+        self.largest_in_corner = largest_in_corner
+        self.bottom_row = bottom_row
+        self.opening_score = opening_score
+
+    def key(self):
+        '''
+        Returns the weights as a tuple, in the order of WEIGHT_NAMES.
+        '''
+        return tuple(getattr(self, name) for name in WEIGHT_NAMES)
+
+    def __eq__(self, other):
+        return isinstance(other, HeuristicWeights) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return 'HeuristicWeights(' + ', '.join(name + '=' + repr(getattr(self, name))
+                                               for name in WEIGHT_NAMES) + ')'
+
+    def to_dict(self):
+        '''
+        Returns the weights as a dict that can be written as JSON.
+        '''
+        return {name: getattr(self, name) for name in WEIGHT_NAMES}
+
+    @staticmethod
+    def from_dict(data):
+        '''
+        Creates HeuristicWeights from the output of "to_dict". Weights that
+        are missing keep their defaults.
+        '''
+        for name in data:
+            if name not in WEIGHT_NAMES:
+                raise ValueError('unknown weight ' + repr(name))
+        return HeuristicWeights(**data)
+
+DEFAULT_WEIGHTS = HeuristicWeights()
+
+class Game2048:
+    def __init__(self, backend='list', rng=None, cache=None, stats=None,
+                 record=False, weights=None, ai_rng=None):
         '''
+        Creates a game of 2048
+
+        Perameters:
+            backend (str): How moves are made, either 'list' or 'bitboard'
+            rng (random.Random): Source of random numbers for the pieces
+                added to the board, and for the AI unless ai_rng is given.
+                Uses the global random module if None.
+            cache (EvaluationCache): Cache of suggested moves, which can be
+                shared between games. Moves are not cached if None.
+            stats (SearchStats): Counters and timings updated by every call
+                to suggest_move, or None to not collect them.
+            record (boolean): If True, every move made on self.board is saved
+                in self.move_history and every random piece added to it in
+                self.spawn_history, so the game can be saved (see
+                records2048.py) and replayed.
+            weights (HeuristicWeights): Weights used by suggest_move to
+                assess sequences of moves. Uses DEFAULT_WEIGHTS if None.
+            ai_rng (random.Random): Source of random numbers for the AI (the
+                opening coin flip and the pieces tried by the lookahead), or
+                None to use rng. With its own generator, the pieces added to
+                the board don't depend on what the AI does, so two AIs can
+                be compared on the same pieces (see ab2048.py).
+        '''
+        if backend not in BACKENDS:
+            raise ValueError('unknown backend ' + repr(backend))
+        self.backend = backend
+        self.rng = rng if rng != None else random
+        self.ai_rng = ai_rng if ai_rng != None else self.rng
+        self.cache = cache
+        self.stats = stats
+        self.weights = weights if weights != None else DEFAULT_WEIGHTS
         self.score = 0
         self.last_move_up = False
+        self.search_depth = 0
+        self.suggest_branch = None
+
+        # Moves made (Direction) and random pieces added (piece, (row, col))
+        # on self.board, or None if the game isn't recorded
+        self.move_history = [] if record else None
+        self.spawn_history = [] if record else None
+
+        # Legal move mask of self.board, kept until the board changes
+        self.move_mask = None
         self.board = [[None, None, None, None],
                       [None, None, None, None],
                       [None, None, None, None],
@@ -75,8 +873,32 @@ class Game2048:
         Returns:
             (boolean): True if game is over, False otherwise.
         '''
-        return not (self.is_down_possible(self.board) or self.is_up_possible(self.board) or
-            self.is_left_possible(self.board) or self.is_right_possible(self.board))
+        return self.legal_moves(self.board) == 0
+
+    def legal_moves(self, board):
+        '''
+        Returns the legal move mask of a board (see "legal_move_mask"). The
+        mask of the game's own board is saved until the board is changed by
+        "move" or "add_piece", so checking it again is free. Code that changes
+        self.board in some other way should call "board_changed".
+
+        Perameters:
+            board (list of list): 2048 board the function checks
+
+        Returns:
+            mask (int): the legal move mask, 0 if the game is over
+        '''
+        if board is not self.board:
+            return legal_move_mask(board)
+        if self.move_mask == None or self.move_mask[0] is not board:
+            self.move_mask = (board, legal_move_mask(board))
+        return self.move_mask[1]
+
+    def board_changed(self):
+        '''
+        Forgets the saved legal move mask of self.board.
+        '''
+        self.move_mask = None
 
     def space_open(self, loc, board):
         '''
@@ -103,29 +925,38 @@ class Game2048:
         '''
         if (self.space_open(loc, board)):
             board[loc[0]][loc[1]] = piece_num
+            if board is self.board:
+                self.move_mask = None
         else:
             logging.error('PIECE REPLACED. UNPREDICTABLE BEHAVIOR TO FOLLOW.')
 
+    def empty_cells(self, board):
+        '''
+        Returns the locations of all the empty spaces on the board.
+
+        Perameters:
+            board (list of list): 2048 board the function searches
+
+        Returns:
+            (list of tuple: (int, int)): locations of empty spaces (row, col)
+        '''
+        return [(i, j) for i in range(4) for j in range(4) if board[i][j] == None]
+
     def add_random_piece(self, board):
         '''
         Adds a random piece to the board passed as a perameter. There is
         a 10% chance that the number added is a four and a 90% chance the
-        number added is a two.
+        number added is a two. Every empty space is equally likely to get
+        the new piece. If there are no empty spaces nothing is added.
 
         Perameters:
             board (list of list): 2048 board for piece to be added to
         '''
-        row_num = random.randint(0,3)
-        col_num = random.randint(0,3)
-
-        if (not self.space_open((row_num, col_num), board)):
-            return self.add_random_piece(board)
-
-        is_four = random.randint(1,10) ==  1
-        if is_four:
-            self.add_piece(4, (row_num, col_num), board)
-        else:
-            self.add_piece(2, (row_num, col_num), board)
+        piece = choose_random_piece(board, self.rng)
+        if piece != None:
+            self.add_piece(piece[0], piece[1], board)
+            if self.spawn_history != None and board is self.board:
+                self.spawn_history.append(piece)
 
     def piece_swap(self, loc1, loc2, board):
         '''
@@ -380,7 +1211,14 @@ class Game2048:
             direction (Enum (Direction)): Direction function makes the move for.
             board (list of list): 2048 board the function makes the move on.
         '''
-        if direction == Direction.UP:
+        if board is self.board:
+            self.move_mask = None
+            if self.move_history != None:
+                self.move_history.append(direction)
+
+        if self.backend == 'bitboard':
+            self.move_bitboard(direction, board)
+        elif direction == Direction.UP:
             self.move_up(board)
         elif direction == Direction.DOWN:
             self.move_down(board)
@@ -389,6 +1227,21 @@ class Game2048:
         else:
             self.move_right(board)
 
+    def move_bitboard(self, direction, board):
+        '''
+        Makes a move the same way as the "move" method, but packs the board
+        into a bitboard and uses precomputed row tables to slide and combine
+        the pieces.
+
+        Perameters:
+            direction (Enum (Direction)): Direction function makes the move for.
+            board (list of list): 2048 board the function makes the move on.
+        '''
+        new_bits, score_gained = BITBOARD_MOVES[direction](bitboard2048.encode(board))
+        bitboard2048.write_board(new_bits, board)
+        self.score += score_gained
+        self.add_random_piece(board)
+
     def is_move_possible(self, direction, board):
         '''
         For a given direction, returns True if the proposed move is possible,
@@ -401,14 +1254,15 @@ class Game2048:
         Returns:
             (boolean): True if the move is legal, false otherwise.
         '''
+        mask = self.legal_moves(board)
         if direction == Direction.LEFT:
-            return self.is_left_possible(board)
+            return mask & MOVE_BITS[Direction.LEFT] != 0
         elif direction == Direction.RIGHT:
-            return self.is_right_possible(board)
+            return mask & MOVE_BITS[Direction.RIGHT] != 0
         elif direction == Direction.DOWN:
-            return self.is_down_possible(board)
+            return mask & MOVE_BITS[Direction.DOWN] != 0
         else:
-            return self.is_up_possible(board)
+            return mask & MOVE_BITS[Direction.UP] != 0
     
     def max_tile_position(self):
         '''
@@ -502,92 +1356,407 @@ class Game2048:
         Perameters:
             board (list of list): the 2048 board the function prints.
         '''
-        print(" ---------------------------------------")
-        print("|\t\t\t\t\t|")
+        # The whole board is built in one string and printed at once
+        lines = [" ---------------------------------------", "|\t\t\t\t\t|"]
         for col in board:
-            print("|\t", end="")
-            for num in col:
-                if num == None:
-                    print("-\t", end="")
-                else:
-                    print(str(num) + "\t", end="")
-            print("|")
-            print("|\t\t\t\t\t|")
-        print(" ---------------------------------------")
+            cells = ["-" if num == None else str(num) for num in col]
+            lines.append("|\t" + "\t".join(cells) + "\t|")
+            lines.append("|\t\t\t\t\t|")
+        lines.append(" ---------------------------------------")
+        print("\n".join(lines))
 
-    def suggest_move(self):
+    def suggest_move(self, deadline_ms=None, depth=None, workers=None):
         '''
         Suggests a move for the current state of the board (the one associated
         with the class). Function assumes user has attempted to stack largest
         tiles towards the bottom of the board.
 
+        Without a deadline, the function looks ahead three moves (or depth
+        moves). With a deadline, it searches one move ahead, then two, and so
+        on, as long as there is time left, and suggests the move from the
+        deepest search that finished. The depth that was reached is saved in
+        self.search_depth (0 if the move was chosen without a search).
+
+        With workers, the lookahead tree is split between a shared pool of
+        processes. The suggested move is the same as without workers.
+
+        Perameters:
+            deadline_ms (float): Time budget for the search in milliseconds,
+                or None to always search depth moves ahead.
+            depth (int): Number of moves to look ahead without a deadline, or
+                the deepest search to try with one. Defaults to SEARCH_DEPTH
+                without a deadline and MAX_SEARCH_DEPTH with one.
+            workers (int): Number of processes to search with, or None to
+                search in this process.
+
+        Returns:
+            (Direction): The direction the function recomends the user moves.
+        '''
+        if self.stats == None:
+            return self.choose_move(deadline_ms, depth, workers)
+
+        self.stats.start_call()
+        start = time.perf_counter()
+        direction = self.choose_move(deadline_ms, depth, workers)
+        self.stats.end_call(self.suggest_branch, time.perf_counter() - start,
+                            self.search_depth)
+        return direction
+
+    def choose_move(self, deadline_ms=None, depth=None, workers=None):
+        '''
+        Does the work of "suggest_move", which takes the same perameters. The
+        way the move was chosen is saved in self.suggest_branch (one of
+        SUGGEST_BRANCHES).
+
         Returns:
             (Direction): The direction the function recomends the user moves.
         '''
+        self.search_depth = 0
 
         # To get the game started, function randomly suggests either left or
         # Down if the moves are availible.
-        if self.score < 300:
-            if random.randint(0, 1) == 1:
-                if self.is_left_possible(self.board):
+        if self.score < self.weights.opening_score:
+            self.suggest_branch = 'opening'
+            mask = self.legal_moves(self.board)
+            if self.ai_rng.randint(0, 1) == 1:
+                if mask & MOVE_BITS[Direction.LEFT]:
                     return Direction.LEFT
-                elif self.is_down_possible(self.board):
+                elif mask & MOVE_BITS[Direction.DOWN]:
                     return Direction.DOWN
                 else:
                     return Direction.RIGHT
             else:
-                if self.is_down_possible(self.board):
+                if mask & MOVE_BITS[Direction.DOWN]:
                     return Direction.DOWN
-                elif self.is_left_possible(self.board):
+                elif mask & MOVE_BITS[Direction.LEFT]:
                     return Direction.LEFT
                 else:
                     return Direction.RIGHT
-        
+
+        if self.cache == None or deadline_ms != None:
+            return self.search_move(deadline_ms, depth, workers)
+
+        # Opening moves are a coin flip, so only the positions after the
+        # opening are cached. The result depends on the board and on whether
+        # the last move was up, and the search can change last_move_up, so
+        # the new value is stored along with the move. Games with different
+        # weights can share a cache, so the weights are part of the key.
+        key = (bitboard2048.encode(self.board), self.last_move_up, depth, self.weights)
+        cached = self.cache.get(key)
+        if cached != None:
+            self.suggest_branch = 'cache_hit'
+            direction, self.last_move_up, self.search_depth = cached
+            return direction
+
+        direction = self.search_move(None, depth, workers)
+        self.cache.put(key, (direction, self.last_move_up, self.search_depth))
+        return direction
+
+    def suggest_move_expectimax(self, depth=2, min_probability=0.0001, evaluate=None):
+        '''
+        Suggests a move for the current state of the board with an expectimax
+        search (see expectimax2048.py). Unlike "suggest_move", the search
+        considers all four directions and the chance of every new piece that
+        could be added after each move.
+
+        Perameters:
+            depth (int): Number of moves the search looks ahead
+            min_probability (float): Boards less likely than this to be
+                reached are not searched further
+            evaluate (function): Evaluation function that takes a bitboard
+                and returns a number. Uses the default heuristic if None.
+
+        Returns:
+            (Direction): The direction the function recomends the user moves.
+        '''
+        if self.stats != None:
+            self.stats.start_call()
+            start = time.perf_counter()
+
+        search = expectimax2048.Expectimax(depth, min_probability, evaluate)
+        direction, value = search.best_move(bitboard2048.encode(self.board))
+
+        if self.stats != None:
+            self.stats.call['nodes'] += search.nodes
+            self.stats.end_call('expectimax', time.perf_counter() - start, depth)
+
+        # No move changes the board, so the game is over
+        if direction == None:
+            return Direction.UP
+
+        return list(Direction)[direction]
+
+    def search_move(self, deadline_ms=None, depth=None, workers=None):
+        '''
+        Suggests a move for the current state of the board once the opening
+        is over, by looking ahead three moves or, with a deadline, as many
+        moves as there is time for.
+
+        Perameters:
+            deadline_ms (float): Time budget for the search in milliseconds,
+                or None to always search depth moves ahead.
+            depth (int): Number of moves to look ahead without a deadline, or
+                the deepest search to try with one.
+            workers (int): Number of processes to search with, or None to
+                search in this process.
+
+        Returns:
+            (Direction): The direction the function recomends the user moves.
+        '''
         # If the last move was up, suggests the user moves down to preserve
         # a preferable game state.
         if (self.last_move_up):
             self.last_move_up = False
-            if self.is_down_possible(self.board):
+            if self.legal_moves(self.board) & MOVE_BITS[Direction.DOWN]:
+                self.suggest_branch = 'down_reply'
                 return Direction.DOWN
         
         # If row is ordered and it is not stable according to the
         # "is_row_stable" function, suggest_move returns Direction.LEFT
         if (self.is_row_ordered(3, self.board) and not self.is_row_stable(3, self.board)):
+            self.suggest_branch = 'left_shortcut'
             return Direction.LEFT
 
-        # creates a set of potential moves
-        potential_moves = set()
-        lst = list(itertools.combinations_with_replacement('DLR', 3))
-        for combination in lst:
-            permutations = list(itertools.permutations(combination))
-            for perm in permutations:
-                potential_moves.add(perm)
-
-        best_moves = None
-        best_assesment = -100000
-
-        # Assesses all the potential moves and saves the one with the best
-        # assessment.
-        for moves in potential_moves:
-            new_board = self.copy_board()
-            assesment = self.assess_moves(moves, new_board)
-            if assesment != None and assesment > best_assesment:
-                best_moves = moves
-                best_assesment = assesment
+        self.suggest_branch = 'search'
 
-        # if best_moves is None, then the only legal direction a player can move
+        if deadline_ms == None:
+            if depth == None:
+                depth = SEARCH_DEPTH
+            best_move = self.search_tree(depth, None, workers)
+            self.search_depth = depth
+        else:
+            if depth == None:
+                depth = MAX_SEARCH_DEPTH
+            # A search one move ahead is always finished so there is a move
+            # to suggest, and deeper searches are given up on once the
+            # deadline passes.
+            deadline = time.perf_counter() + deadline_ms / 1000
+            best_move = self.search_tree(1)
+            self.search_depth = 1
+            for search_depth in range(2, depth + 1):
+                if time.perf_counter() >= deadline:
+                    break
+                try:
+                    best_move = self.search_tree(search_depth, deadline, workers)
+                except SearchTimeout:
+                    break
+                self.search_depth = search_depth
+
+        # if best_move is None, then the only legal direction a player can move
         # must be up, assuming that the game isn't already over.
-        if best_moves == None:
+        if best_move == None:
             self.last_move_up = True
             return Direction.UP
 
-        # Returns the first move in the best sequence of moves
-        if best_moves[0] == 'D':
-            return Direction.DOWN
-        elif best_moves[0] == 'L':
-            return Direction.LEFT
+        return SEARCH_MOVES[best_move]
+
+    def search_tree(self, depth, deadline=None, workers=None):
+        '''
+        Searches the tree of all sequences of depth moves (excluding up) and
+        returns the first move of the sequence with the best assessment.
+        First moves are tried in the order 'D', 'L', 'R' so ties are broken
+        the same way every time.
+
+        Below the first two moves, the tree is split into subtrees that are
+        searched by "search_subtree", either one after another or in a pool
+        of worker processes. Each subtree gets its own random number
+        generator seeded from one number drawn from self.ai_rng, so the result
+        is the same either way.
+
+        Perameters:
+            depth (int): Number of moves in each sequence
+            deadline (float): time.perf_counter() value after which the
+                search raises SearchTimeout, or None for no deadline
+            workers (int): Number of processes to search with, or None to
+                search in this process.
+
+        Returns:
+            best_move (str): 'D', 'L' or 'R', or None if none of these moves
+                are possible
+        '''
+        seed = self.ai_rng.getrandbits(32) * 16
+        board = freeze_board(self.board)
+        collect_stats = self.stats != None
+        if collect_stats:
+            self.stats.call['copies'] += 1
+        old_bottom_row_score = row_properties(board[3])[3]
+
+        mask = self.legal_moves(self.board)
+        first_moves = []
+        tasks = []
+        for i, move in enumerate(SEARCH_MOVES):
+            # The first move must be possible
+            if not mask & MOVE_BITS[SEARCH_MOVES[move]]:
+                continue
+            step_score, new_board = self.expand_move(move, board,
+                random.Random(seed + 4 * i + 3))
+            score = self.first_move_score(move, board) + step_score
+            first_moves.append(move)
+            if depth == 1:
+                tasks.append(self.best_sequence_score(new_board, 0, score,
+                    old_bottom_row_score, None))
+                continue
+            for j, second in enumerate(SEARCH_MOVES):
+                tasks.append((new_board, second, score, depth - 1,
+                    old_bottom_row_score, seed + 4 * i + j, deadline,
+                    collect_stats, self.weights))
+
+        if depth == 1:
+            results = tasks
+        else:
+            if workers == None:
+                outcomes = []
+                for task in tasks:
+                    outcomes.append(search_subtree(task))
+                    if outcomes[-1][0] == None:
+                        break
+            else:
+                outcomes = list(get_search_pool(workers).map(search_subtree, tasks))
+            results = []
+            for value, counts in outcomes:
+                if counts != None:
+                    self.stats.add(counts)
+                results.append(value)
+            if None in results:
+                raise SearchTimeout()
+
+        # Each first move has one result per subtree below it
+        per_move = len(results) // len(first_moves) if first_moves else 0
+        best_move = None
+        best_assesment = None
+        for i, move in enumerate(first_moves):
+            assesment = max(results[i * per_move:(i + 1) * per_move])
+            if best_assesment == None or assesment > best_assesment:
+                best_move = move
+                best_assesment = assesment
+        return best_move
+
+    def first_move_score(self, move, board):
+        '''
+        Returns the extra weight given to a sequence of moves because of its
+        first move. This is the same weight given by "assess_moves".
+
+        Perameters:
+            move (str): The first move of the sequence ('D', 'L' or 'R')
+            board (list of list): 2048 board before the first move
+
+        Returns:
+            score (int): The extra weight for the first move
+        '''
+        weights = self.weights
+        score = 0
+        ordered, stable, could_distrupt = row_properties(tuple(board[3]))[:3]
+        could_distrupt = ordered and could_distrupt
+        if move == 'L':
+            if could_distrupt:
+                score += weights.left_first
+        elif move == 'D':
+            if could_distrupt:
+                score += weights.disrupt_first
         else:
-            return Direction.RIGHT
+            if could_distrupt:
+                score += weights.disrupt_first
+            if ordered and stable:
+                score += weights.right_first
+        return score
+
+    def expand_move(self, move, board, rng):
+        '''
+        Makes one move of a lookahead sequence and returns the weight
+        "assess_moves" gives the step, including the points scored by the
+        move. The board passed in and the game are not changed. If the move is
+        not possible, the same board is returned.
+
+        Perameters:
+            move (str): The move to make ('D', 'L' or 'R')
+            board (tuple of tuple): immutable 2048 board before the move
+            rng (random.Random): Source of random numbers for the piece added
+                after the move
+
+        Returns:
+            (tuple: (int, tuple of tuple)): The weight of the step and the
+                board after the move
+        '''
+        new_board, score_gained, changed = transition(board, SEARCH_MOVES[move])
+        if self.stats != None:
+            counts = self.stats.call
+            counts['nodes'] += 1
+            if changed:
+                counts['moves'] += 1
+                counts['copies'] += 1
+
+        score = 0
+        if move == 'L':
+            if changed:
+                ordered, stable, could_distrupt = row_properties(board[3])[:3]
+                if ordered and could_distrupt:
+                    score += self.weights.left_step
+        elif move == 'R':
+            score += self.weights.right_step
+            if changed:
+                ordered, stable, could_distrupt = row_properties(board[3])[:3]
+                if ordered and not stable:
+                    score += self.weights.right_unstable
+
+        if not changed:
+            return score, board
+        return score + score_gained, with_random_piece(new_board, rng)
+
+    def best_sequence_score(self, board, moves_left, score, old_bottom_row_score,
+                            rng, deadline=None):
+        '''
+        Returns the best assessment of all the sequences that continue from
+        board with moves_left more moves. Every board in the tree is computed
+        once and shared by all the sequences that start with the same moves.
+
+        Perameters:
+            board (tuple of tuple): immutable 2048 board reached so far
+            moves_left (int): Number of moves left in the sequence
+            score (int): Weight given to the moves made so far
+            old_bottom_row_score (int): Bottom row score of the starting board
+            rng (random.Random): Source of random numbers for the pieces added
+                during the lookahead
+            deadline (float): time.perf_counter() value after which the
+                search raises SearchTimeout, or None for no deadline
+
+        Returns:
+            (int): The best assessment, on the same scale as "assess_moves"
+        '''
+        if deadline != None and time.perf_counter() >= deadline:
+            raise SearchTimeout()
+
+        if moves_left == 0:
+            if self.stats == None:
+                bottom = row_properties(board[3])
+                in_corner = is_largest_in_corner(board)
+            else:
+                start = time.perf_counter()
+                bottom = row_properties(board[3])
+                middle = time.perf_counter()
+                in_corner = is_largest_in_corner(board)
+                counts = self.stats.call
+                counts['corner_seconds'] += time.perf_counter() - middle
+                counts['row_seconds'] += middle - start
+                counts['sequences'] += 1
+                if bottom[0]:
+                    counts['ordered_hits'] += 1
+                if in_corner:
+                    counts['corner_hits'] += 1
+            weights = self.weights
+            if bottom[0]:
+                score += weights.ordered_bottom
+            if in_corner:
+                score += weights.largest_in_corner
+            return score + weights.bottom_row * (bottom[3] - old_bottom_row_score)
+
+        best = None
+        for move in SEARCH_MOVES:
+            step_score, new_board = self.expand_move(move, board, rng)
+            assesment = self.best_sequence_score(new_board, moves_left - 1,
+                score + step_score, old_bottom_row_score, rng, deadline)
+            if best == None or assesment > best:
+                best = assesment
+        return best
 
     def assess_moves(self, moves, board):
         '''
@@ -604,7 +1773,7 @@ class Game2048:
                 better likely game state.
         '''
         score = 0
-        was_bottom_ordered = self.is_row_ordered(3, board)
+        ordered, stable, could_distrupt, old_bottom_row_score = row_properties(tuple(board[3]))[:4]
 
         # 3 conditionals shown below give extra wieght to the first move
         if (moves[0] == 'L'):
@@ -613,30 +1782,29 @@ class Game2048:
             
             # Function gives extra weight to a sequence of moves if the first
             # move is left and other moves would distrupt the board unfavorably 
-            if (self.is_row_ordered(3, board) and self.could_down_distrupt_bottom(board)):
-                score += 1000
+            if (ordered and could_distrupt):
+                score += self.weights.left_first
         if (moves[0] == 'D'):
             if not self.is_down_possible(board):
                 return None
             
             # If the first move is down, and this would likely distrupt the
             # board, points are taken away
-            if (self.is_row_ordered(3, board) and self.could_down_distrupt_bottom(board)):
-                score -= 200
+            if (ordered and could_distrupt):
+                score += self.weights.disrupt_first
         if (moves[0] == 'R'):
             if not self.is_right_possible(board):
                 return None
-            if (self.is_row_ordered(3, board) and self.could_down_distrupt_bottom(board)):
-                score -= 200
+            if (ordered and could_distrupt):
+                score += self.weights.disrupt_first
 
             # If the bottom row is stable and ordered, function gives weight to
             # Right move
-            if (self.is_row_ordered(3, board) and self.is_row_stable(3, board)):
-                score += 8
+            if (ordered and stable):
+                score += self.weights.right_first
 
         # temp variables before moves are made
         temp_score = self.score
-        old_bottom_row_score = self.bottom_row_score(board)
 
         # Goes through moves, game score is automatically updated by the class
         for move in moves:
@@ -648,32 +1816,35 @@ class Game2048:
                     
                     # Statement below gives wieght to sequences that don't mess
                     # up the bottom of the board
-                    if (self.is_row_ordered(3, board) and self.could_down_distrupt_bottom(board)):
-                        score += 100
+                    ordered, stable, could_distrupt = row_properties(tuple(board[3]))[:3]
+                    if (ordered and could_distrupt):
+                        score += self.weights.left_step
                     self.move(Direction.LEFT, board)
             elif move == 'R':
-                score -= 4
+                score += self.weights.right_step
                 if self.is_right_possible(board):
 
                     # Statement below gives wieght to sequences that don't mess
                     # up the bottom of the board
-                    if (self.is_row_ordered(3, board) and not self.is_row_stable(3, board)):
-                        score -= 5000
+                    ordered, stable, could_distrupt = row_properties(tuple(board[3]))[:3]
+                    if (ordered and not stable):
+                        score += self.weights.right_unstable
                     self.move(Direction.RIGHT, board)
             else:
                 logging.error('NOT A VALID DIRECTION.')
         score_improvement = self.score - temp_score
-        new_bottom_row_score = self.bottom_row_score(board)
+        ordered, stable, could_distrupt, new_bottom_row_score = row_properties(tuple(board[3]))[:4]
 
         # Conditionals below gives wieght to sequences that don't mess
         # up the bottom of the board
-        if self.is_row_ordered(3, board):
-            score += 1000
-        if self.loc_largest_piece(board) == (3, 0):
-            score += 10000
+        if ordered:
+            score += self.weights.ordered_bottom
+        if is_largest_in_corner(freeze_board(board)):
+            score += self.weights.largest_in_corner
         
         self.score = temp_score
-        return score_improvement + score + 4 * (new_bottom_row_score - old_bottom_row_score)
+        return (score_improvement + score +
+                self.weights.bottom_row * (new_bottom_row_score - old_bottom_row_score))
 
     def copy_board(self):
         '''
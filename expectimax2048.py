@@ -0,0 +1,210 @@
+import bitboard2048
+'''
+This file contains an expectimax search for 2048 that works on the bitboards
+from bitboard2048.py.
+
+The search alternates between two kinds of nodes:
+    1. Player nodes, where the value of the board is the best value of the
+       boards reached by each possible move (left, right, up or down).
+    2. Chance nodes, where a random piece is added. The value of the board is
+       the average value of every possible new piece in every empty cell,
+       weighted by its probability (a two 90% of the time and a four 10% of
+       the time).
+
+The search stops when it has made "depth" moves or when the probability of
+reaching a board falls below "min_probability", and the board is then scored
+by an evaluation function. Any function that takes a bitboard and returns a
+number can be used. The default one, "heuristic_score", rewards empty cells,
+possible merges and rows and columns that are ordered.
+'''
+
+# Direction indexes used in this file. They are in the same order as the
+# members of classes2048.Direction.
+LEFT = 0
+RIGHT = 1
+UP = 2
+DOWN = 3
+
+MOVES = [bitboard2048.move_left, bitboard2048.move_right,
+         bitboard2048.move_up, bitboard2048.move_down]
+
+# Probability of each new piece, stored as (exponent, probability)
+NEW_PIECES = ((1, 0.9), (2, 0.1))
+
+# Weights of the default evaluation function
+LOST_PENALTY = 200000.0
+MONOTONICITY_POWER = 4.0
+MONOTONICITY_WEIGHT = 47.0
+SUM_POWER = 3.5
+SUM_WEIGHT = 11.0
+MERGES_WEIGHT = 700.0
+EMPTY_WEIGHT = 270.0
+
+# Score of every 16 bit row for the default evaluation function. Filled the
+# first time heuristic_score is called.
+ROW_HEURISTIC = []
+
+def row_heuristic(cells):
+    '''
+    Scores one row or column for the default evaluation function.
+
+    Perameters:
+        cells (list of int): 4 exponents, 0 for an empty cell
+
+    Returns:
+        (float): score of the row, higher is better
+    '''
+    tile_sum = 0.0
+    empty = 0
+    merges = 0
+    prev = 0
+    counter = 0
+    for cell in cells:
+        tile_sum += cell ** SUM_POWER
+        if cell == 0:
+            empty += 1
+        else:
+            if prev == cell:
+                counter += 1
+            elif counter > 0:
+                merges += 1 + counter
+                counter = 0
+            prev = cell
+    if counter > 0:
+        merges += 1 + counter
+
+    monotonicity_left = 0.0
+    monotonicity_right = 0.0
+    for i in range(1, 4):
+        if cells[i - 1] > cells[i]:
+            monotonicity_left += (cells[i - 1] ** MONOTONICITY_POWER -
+                                  cells[i] ** MONOTONICITY_POWER)
+        else:
+            monotonicity_right += (cells[i] ** MONOTONICITY_POWER -
+                                   cells[i - 1] ** MONOTONICITY_POWER)
+
+    return (LOST_PENALTY + EMPTY_WEIGHT * empty + MERGES_WEIGHT * merges -
+            MONOTONICITY_WEIGHT * min(monotonicity_left, monotonicity_right) -
+            SUM_WEIGHT * tile_sum)
+
+def build_heuristic_table():
+    '''
+    Fills ROW_HEURISTIC. Does nothing if the table was already built.
+    '''
+    if ROW_HEURISTIC:
+        return
+    ROW_HEURISTIC.extend(row_heuristic(bitboard2048.row_to_cells(row))
+                         for row in range(65536))
+
+def heuristic_score(bits):
+    '''
+    The default evaluation function. Adds up the score of every row and
+    every column of the board.
+
+    Perameters:
+        bits (int): the packed board
+
+    Returns:
+        (float): score of the board, higher is better
+    '''
+    if not ROW_HEURISTIC:
+        build_heuristic_table()
+    table = ROW_HEURISTIC
+    columns = bitboard2048.transpose(bits)
+    return (table[bits & 0xFFFF] + table[(bits >> 16) & 0xFFFF] +
+            table[(bits >> 32) & 0xFFFF] + table[bits >> 48] +
+            table[columns & 0xFFFF] + table[(columns >> 16) & 0xFFFF] +
+            table[(columns >> 32) & 0xFFFF] + table[columns >> 48])
+
+def empty_shifts(bits):
+    '''
+    Returns the bit positions of the empty cells of a packed board.
+    '''
+    return [shift for shift in range(0, 64, 4) if (bits >> shift) & 0xF == 0]
+
+class Expectimax:
+    def __init__(self, depth=2, min_probability=0.0001, evaluate=None):
+        '''
+        Creates an expectimax search.
+
+        Perameters:
+            depth (int): Number of moves the search looks ahead
+            min_probability (float): Boards that are less likely than this to
+                be reached are scored by the evaluation function instead of
+                being searched further
+            evaluate (function): Evaluation function that takes a bitboard
+                and returns a number. Uses heuristic_score if None.
+        '''
+        if depth < 1:
+            raise ValueError('depth must be at least 1')
+        self.depth = depth
+        self.min_probability = min_probability
+        self.evaluate = evaluate if evaluate != None else heuristic_score
+        self.nodes = 0
+        self.table = {}
+
+    def best_move(self, bits, directions=(LEFT, RIGHT, UP, DOWN)):
+        '''
+        Returns the best move for a packed board.
+
+        Perameters:
+            bits (int): the packed board
+            directions (tuple of int): the moves that can be chosen
+
+        Returns:
+            (tuple: (int, float)): The best direction and its value. The
+                direction is None if none of the moves change the board.
+        '''
+        self.nodes = 0
+        self.table = {}
+        best_direction = None
+        best_value = None
+        for direction in directions:
+            new_bits = MOVES[direction](bits)[0]
+            if new_bits == bits:
+                continue
+            value = self.chance_value(new_bits, self.depth - 1, 1.0)
+            if best_value == None or value > best_value:
+                best_direction = direction
+                best_value = value
+        return best_direction, best_value
+
+    def player_value(self, bits, depth, probability):
+        '''
+        Returns the value of a board where the player moves next. A board
+        where no move is possible is worth 0.
+        '''
+        self.nodes += 1
+        best = 0.0
+        for move in MOVES:
+            new_bits = move(bits)[0]
+            if new_bits != bits:
+                value = self.chance_value(new_bits, depth - 1, probability)
+                if value > best:
+                    best = value
+        return best
+
+    def chance_value(self, bits, depth, probability):
+        '''
+        Returns the value of a board where a random piece is added next.
+        '''
+        if depth == 0 or probability < self.min_probability:
+            return self.evaluate(bits)
+
+        # The same board is often reached by different orders of moves
+        key = (bits, depth)
+        if key in self.table:
+            return self.table[key]
+
+        self.nodes += 1
+        shifts = empty_shifts(bits)
+        cell_probability = probability / len(shifts)
+        total = 0.0
+        for shift in shifts:
+            for exponent, piece_probability in NEW_PIECES:
+                total += piece_probability * self.player_value(
+                    bits | (exponent << shift), depth,
+                    cell_probability * piece_probability)
+        value = total / len(shifts)
+        self.table[key] = value
+        return value
@@ -0,0 +1,131 @@
+from runstats2048 import Distribution
+import argparse
+import asyncio
+import json
+import time
+HOST = '127.0.0.1'
+PORT = 2048
+CLIENTS = 100
+DURATION = 30
+'''
+File measures how the server in server2048.py holds up under load. It opens
+many connections at once, and on each one plays games by asking the server
+for a suggested move and then making it, starting a new game whenever one
+ends. If the suggested move isn't possible, the first possible move is made
+instead.
+
+When the time is up, it prints:
+    1. The number of moves made and moves per second
+    2. The number of suggestions and their latency (p50, p90, p99 and max)
+       in milliseconds
+    3. The number of games finished and the number of errors
+
+Start the server first, for example:
+
+    python3 server2048.py --workers 4
+    python3 loadtest2048.py --clients 200 --duration 30
+'''
+
+class LoadTest:
+    def __init__(self):
+        '''
+        Creates the counters shared by every client.
+        '''
+        self.moves = 0
+        self.games = 0
+        self.errors = 0
+        self.latencies = Distribution()
+
+async def request(reader, writer, message):
+    '''
+    Sends one request to the server and returns its response.
+    '''
+    writer.write(json.dumps(message).encode() + b'\n')
+    await writer.drain()
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError('server closed the connection')
+    return json.loads(line)
+
+async def run_client(test, host, port, deadline, seed):
+    '''
+    Plays games on one connection until the deadline.
+
+    Perameters:
+        test (LoadTest): counters to update
+        host (str): address of the server
+        port (int): port of the server
+        deadline (float): time.monotonic() value to stop at
+        seed (int): seed of the first game, later games count up from it
+    '''
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        state = await request(reader, writer, {'op': 'create', 'seed': seed})
+        while time.monotonic() < deadline:
+            if not state['ok']:
+                test.errors += 1
+                break
+            if state['game_over']:
+                test.games += 1
+                await request(reader, writer, {'op': 'close', 'session': state['session']})
+                seed += 1
+                state = await request(reader, writer, {'op': 'create', 'seed': seed})
+                continue
+
+            start = time.perf_counter()
+            response = await request(reader, writer,
+                                     {'op': 'suggest', 'session': state['session']})
+            test.latencies.add((time.perf_counter() - start) * 1000)
+            if not response['ok']:
+                test.errors += 1
+                break
+            direction = response['direction']
+            if direction not in state['moves']:
+                direction = state['moves'][0]
+            state = await request(reader, writer, {'op': 'move', 'session': state['session'],
+                                                   'direction': direction})
+            test.moves += 1
+        if state['ok']:
+            await request(reader, writer, {'op': 'close', 'session': state['session']})
+    finally:
+        writer.close()
+
+async def run_load_test(host, port, clients, duration):
+    '''
+    Runs clients connections at once for duration seconds.
+
+    Returns:
+        (tuple: (LoadTest, float)): the counters and the seconds taken
+    '''
+    test = LoadTest()
+    start = time.monotonic()
+    deadline = start + duration
+    results = await asyncio.gather(*[run_client(test, host, port, deadline, i * 1000000)
+                                     for i in range(clients)], return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            test.errors += 1
+    return test, time.monotonic() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Put the 2048 server under load.')
+    parser.add_argument('--host', default=HOST, help='address of the server')
+    parser.add_argument('--port', type=int, default=PORT, help='port of the server')
+    parser.add_argument('--clients', type=int, default=CLIENTS,
+                        help='number of connections playing at once')
+    parser.add_argument('--duration', type=float, default=DURATION,
+                        help='seconds to run for')
+    args = parser.parse_args()
+
+    test, seconds = asyncio.run(run_load_test(args.host, args.port, args.clients,
+                                              args.duration))
+    latencies = test.latencies
+    print("Moves:", test.moves, "moves per second:", round(test.moves / seconds, 1))
+    if latencies.count:
+        print("Suggestions:", latencies.count, "latency ms: p50",
+              round(latencies.quantile(0.5), 2), "p90", round(latencies.quantile(0.9), 2),
+              "p99", round(latencies.quantile(0.99), 2), "max", round(latencies.max, 2))
+    print("Games finished:", test.games, "errors:", test.errors)
+
+if __name__ == '__main__':
+    main()
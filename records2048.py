@@ -0,0 +1,340 @@
+from classes2048 import Direction
+from classes2048 import transition
+from array import array
+import mmap
+import os
+import struct
+'''
+This file saves whole games of 2048 in a compact binary file and reads them
+back, so games played by simulategames.py can be studied after the run
+without playing them again.
+
+A record file is laid out like this:
+    1. A header: the bytes b'G2048REC' and a format version.
+    2. One record per game, appended as soon as the game ends. A record
+       starts with its length, the final score, the exponent of the largest
+       tile, the number of moves, the number of random pieces and the length
+       of the seed. Then come the seed (as text), the moves packed 2 bits
+       each, the locations of the random pieces packed 4 bits each (row * 4
+       + col) and one bit per random piece that is set if the piece was a
+       four.
+    3. An index footer, written when the file is closed: the offset of every
+       record, the number of records, the offset of the index and the bytes
+       b'G2048IDX'.
+
+About 1000 moves fit in less than a kilobyte, so a million games take up
+less than a gigabyte. The reader maps the file into memory and only decodes
+the games that are asked for, and "summaries" reads only the record headers,
+so even very large files can be scanned quickly.
+
+If a run is stopped before the file is closed, the footer is missing. The
+reader and the writer then find the records by reading their lengths one
+after another, and the writer adds the footer again when it is closed.
+'''
+
+MAGIC = b'G2048REC'
+INDEX_MAGIC = b'G2048IDX'
+VERSION = 1
+
+FILE_HEADER = struct.Struct('<8sH')
+# length, score, largest exponent, number of moves, number of pieces,
+# length of the seed
+RECORD_HEADER = struct.Struct('<IIBIIH')
+FOOTER = struct.Struct('<QQ8s')
+
+DIRECTIONS = list(Direction)
+
+# The 4 moves packed into each possible byte, first move in the lowest bits
+MOVE_BYTES = [tuple(DIRECTIONS[(byte >> shift) & 3] for shift in (0, 2, 4, 6))
+              for byte in range(256)]
+
+class GameRecord:
+    def __init__(self, seed, score, max_tile, moves, spawns):
+        '''
+        Creates the record of one game.
+
+        Perameters:
+            seed (str): seed of the game's random number generator, or None
+            score (int): final score
+            max_tile (int): largest tile on the final board
+            moves (list of Direction): every move made, in order
+            spawns (list of tuple: (int, tuple: (int, int))): every random
+                piece added, in order, as (piece, (row, col))
+        '''
+        self.seed = seed
+        self.score = score
+        self.max_tile = max_tile
+        self.moves = moves
+        self.spawns = spawns
+
+    def replay(self):
+        '''
+        Plays the game again from its moves and random pieces.
+
+        Returns:
+            boards (list of tuple of tuple): The board at the start of the
+                game and after every move, including the random piece
+                added after it
+        '''
+        board = ((None,) * 4,) * 4
+        spawns = iter(self.spawns)
+        board = add_spawn(add_spawn(board, next(spawns)), next(spawns))
+        boards = [board]
+        for move in self.moves:
+            board = transition(board, move)[0]
+            if any(None in row for row in board):
+                board = add_spawn(board, next(spawns))
+            boards.append(board)
+        return boards
+
+def add_spawn(board, spawn):
+    '''
+    Returns a copy of an immutable board with a piece from a record added.
+    '''
+    piece_num, (row, col) = spawn
+    new_row = board[row][:col] + (piece_num,) + board[row][col + 1:]
+    return board[:row] + (new_row,) + board[row + 1:]
+
+def encode_game(seed, game):
+    '''
+    Encodes a finished game as a record.
+
+    Perameters:
+        seed (str): seed of the game's random number generator, or None
+        game (Game2048): a game created with record=True
+
+    Returns:
+        (bytes): the record
+    '''
+    moves = [direction.value - 1 for direction in game.move_history]
+    moves += [0] * (-len(moves) % 4)
+    move_bytes = bytes(moves[i] | (moves[i + 1] << 2) | (moves[i + 2] << 4) |
+                       (moves[i + 3] << 6) for i in range(0, len(moves), 4))
+
+    spawns = game.spawn_history
+    cells = [row * 4 + col for piece, (row, col) in spawns]
+    cells += [0] * (len(cells) % 2)
+    cell_bytes = bytes(cells[i] | (cells[i + 1] << 4) for i in range(0, len(cells), 2))
+    fours = bytearray((len(spawns) + 7) // 8)
+    for i, (piece, loc) in enumerate(spawns):
+        if piece == 4:
+            fours[i // 8] |= 1 << (i % 8)
+
+    seed_bytes = b'' if seed == None else str(seed).encode()
+    max_tile = game.get_largest_piece()
+    length = (RECORD_HEADER.size + len(seed_bytes) + len(move_bytes) +
+              len(cell_bytes) + len(fours))
+    header = RECORD_HEADER.pack(length, game.score, max_tile.bit_length() - 1 if max_tile else 0,
+                                len(game.move_history), len(spawns), len(seed_bytes))
+    return header + seed_bytes + move_bytes + cell_bytes + bytes(fours)
+
+def decode_game(data, offset=0):
+    '''
+    Decodes the record that starts at offset in data.
+
+    Returns:
+        (GameRecord): the game
+    '''
+    (length, score, max_exponent, num_moves, num_spawns,
+     seed_length) = RECORD_HEADER.unpack_from(data, offset)
+    start = offset + RECORD_HEADER.size
+    seed = bytes(data[start:start + seed_length]).decode() if seed_length else None
+    start += seed_length
+
+    moves = []
+    for byte in data[start:start + (num_moves + 3) // 4]:
+        moves.extend(MOVE_BYTES[byte])
+    del moves[num_moves:]
+    start += (num_moves + 3) // 4
+
+    cells = []
+    for byte in data[start:start + (num_spawns + 1) // 2]:
+        cells.append(byte & 15)
+        cells.append(byte >> 4)
+    start += (num_spawns + 1) // 2
+    fours = data[start:start + (num_spawns + 7) // 8]
+    spawns = []
+    for i in range(num_spawns):
+        piece = 4 if fours[i // 8] >> (i % 8) & 1 else 2
+        spawns.append((piece, (cells[i] // 4, cells[i] % 4)))
+
+    max_tile = 1 << max_exponent if max_exponent else 0
+    return GameRecord(seed, score, max_tile, moves, spawns)
+
+def read_offsets(data):
+    '''
+    Returns the offsets of the records in a record file and where the
+    records end. The offsets are read from the index footer, or found by
+    reading the records one after another if there is no footer.
+
+    Perameters:
+        data (bytes or mmap): contents of the file
+
+    Returns:
+        (tuple: (array, int)): the offsets and the end of the last record
+    '''
+    magic, version = FILE_HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError('not a 2048 record file')
+    if version != VERSION:
+        raise ValueError('unsupported record file version ' + str(version))
+
+    if len(data) >= FILE_HEADER.size + FOOTER.size:
+        count, index_offset, index_magic = FOOTER.unpack_from(data, len(data) - FOOTER.size)
+        if (index_magic == INDEX_MAGIC and
+                index_offset + count * 8 + FOOTER.size == len(data)):
+            offsets = array('Q')
+            offsets.frombytes(data[index_offset:index_offset + count * 8])
+            return offsets, index_offset
+
+    # No footer, so the run was stopped before the file was closed. A
+    # record cut off part of the way through is left out.
+    offsets = array('Q')
+    offset = FILE_HEADER.size
+    while offset + RECORD_HEADER.size <= len(data):
+        length = RECORD_HEADER.unpack_from(data, offset)[0]
+        if length < RECORD_HEADER.size or offset + length > len(data):
+            break
+        offsets.append(offset)
+        offset += length
+    return offsets, offset
+
+class RecordWriter:
+    def __init__(self, path, keep=None):
+        '''
+        Opens a record file for appending games. A new file is created if
+        there isn't one. The index footer is written by "close", and is
+        removed while games are being added.
+
+        Perameters:
+            path (str): the record file
+            keep (int): if not None, only the first keep games already in
+                the file are kept, for example when a run is resumed from a
+                checkpoint
+        '''
+        self.path = path
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self.file = open(path, 'r+b')
+            with mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                self.offsets, end = read_offsets(data)
+            if keep != None and keep < len(self.offsets):
+                end = self.offsets[keep]
+                del self.offsets[keep:]
+            self.file.truncate(end)
+            self.file.seek(end)
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(FILE_HEADER.pack(MAGIC, VERSION))
+            self.offsets = array('Q')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def write_game(self, seed, game):
+        '''
+        Appends a finished game to the file.
+
+        Perameters:
+            seed (str): seed of the game's random number generator, or None
+            game (Game2048): a game created with record=True
+        '''
+        self.write_record(encode_game(seed, game))
+
+    def write_record(self, record):
+        '''
+        Appends a record made by "encode_game" to the file.
+        '''
+        self.offsets.append(self.file.tell())
+        self.file.write(record)
+
+    def flush(self):
+        '''
+        Makes sure every game written so far is in the file.
+        '''
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        '''
+        Writes the index footer and closes the file.
+        '''
+        if self.file.closed:
+            return
+        index_offset = self.file.tell()
+        self.file.write(self.offsets.tobytes())
+        self.file.write(FOOTER.pack(len(self.offsets), index_offset, INDEX_MAGIC))
+        self.file.close()
+
+class RecordBuffer:
+    def __init__(self):
+        '''
+        Collects encoded games in memory, for example in a worker process
+        that sends them back to be written by a RecordWriter.
+        '''
+        self.records = []
+
+    def write_game(self, seed, game):
+        '''
+        Encodes a finished game and keeps the record in self.records.
+        '''
+        self.records.append(encode_game(seed, game))
+
+class RecordReader:
+    def __init__(self, path):
+        '''
+        Opens a record file for reading. The file is mapped into memory and
+        games are only decoded when they are asked for.
+
+        Perameters:
+            path (str): the record file
+        '''
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.offsets = read_offsets(self.data)[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        '''
+        Returns the game at index (GameRecord).
+        '''
+        return decode_game(self.data, self.offsets[index])
+
+    def __iter__(self):
+        for offset in self.offsets:
+            yield decode_game(self.data, offset)
+
+    def summaries(self):
+        '''
+        Reads only the header of every record, which is much faster than
+        decoding the games.
+
+        Returns:
+            (generator of tuple: (int, int, int)): (score, max_tile,
+                num_moves) for every game in the file
+        '''
+        unpack = RECORD_HEADER.unpack_from
+        data = self.data
+        for offset in self.offsets:
+            length, score, max_exponent, num_moves = unpack(data, offset)[:4]
+            yield score, 1 << max_exponent if max_exponent else 0, num_moves
+
+    def close(self):
+        '''
+        Closes the file.
+        '''
+        self.data.close()
+        self.file.close()
@@ -0,0 +1,112 @@
+import sys
+CELL_WIDTH = 8
+BOARD_WIDTH = 41
+
+# ANSI escape codes understood by almost every terminal
+CLEAR_SCREEN = '\x1b[2J'
+HIDE_CURSOR = '\x1b[?25l'
+SHOW_CURSOR = '\x1b[?25h'
+CLEAR_LINE = '\x1b[K'
+'''
+This file draws 2048 boards in a terminal for watching games live, for
+example in the autoplay mode of TUI.py.
+
+The board looks the same as the one printed by "show_board" in the Game2048
+class, with a line of text above it (such as the score) and one below it.
+The first frame is drawn in full. After that, only the cells and lines that
+changed are drawn again: the cursor is moved to each of them with ANSI
+escape codes and the new text is written over the old. Each frame is built
+in one string and written to the terminal at once, so the board doesn't
+flicker and drawing it takes little time, even at thousands of frames per
+second.
+'''
+
+def cell_text(num):
+    '''
+    Returns the text of one cell, padded to the width of a cell.
+    '''
+    if num == None:
+        return '-'.ljust(CELL_WIDTH)
+    return str(num).ljust(CELL_WIDTH)
+
+def move_cursor(line, col):
+    '''
+    Returns the escape code that moves the cursor to a line and column of the
+    screen, both counted from 0.
+    '''
+    return '\x1b[' + str(line + 1) + ';' + str(col + 1) + 'H'
+
+class BoardRenderer:
+    def __init__(self, stream=None):
+        '''
+        Creates a renderer. Nothing is drawn until "draw" is called.
+
+        Perameters:
+            stream (file): where to write the frames, sys.stdout if None
+        '''
+        self.stream = stream if stream != None else sys.stdout
+        self.cells = None
+        self.header = None
+        self.footer = None
+        self.frames = 0
+
+    def full_frame(self, board, header, footer):
+        '''
+        Returns the text that clears the screen and draws a whole frame.
+        '''
+        border = ' ' + '-' * (BOARD_WIDTH - 2)
+        blank = '|' + ' ' * (BOARD_WIDTH - 2) + '|'
+        lines = [header, border, blank]
+        for row in board:
+            lines.append('|' + ' ' * (CELL_WIDTH - 1) +
+                         ''.join(cell_text(num) for num in row) + '|')
+            lines.append(blank)
+        lines.append(border)
+        lines.append(footer)
+        return HIDE_CURSOR + CLEAR_SCREEN + move_cursor(0, 0) + '\n'.join(lines)
+
+    def changes(self, board, header, footer):
+        '''
+        Returns the text that draws only the cells and lines that changed
+        since the last frame.
+        '''
+        parts = []
+        if header != self.header:
+            parts.append(move_cursor(0, 0) + header + CLEAR_LINE)
+        for i, row in enumerate(board):
+            for j, num in enumerate(row):
+                if num != self.cells[i][j]:
+                    parts.append(move_cursor(3 + 2 * i, CELL_WIDTH * (j + 1)) + cell_text(num))
+        if footer != self.footer:
+            parts.append(move_cursor(12, 0) + footer + CLEAR_LINE)
+        return ''.join(parts)
+
+    def draw(self, board, header='', footer=''):
+        '''
+        Draws one frame with a single write to the stream.
+
+        Perameters:
+            board (list of list): the 2048 board to draw
+            header (str): line of text above the board
+            footer (str): line of text below the board
+        '''
+        if self.cells == None:
+            frame = self.full_frame(board, header, footer)
+        else:
+            frame = self.changes(board, header, footer)
+        self.cells = [list(row) for row in board]
+        self.header = header
+        self.footer = footer
+        self.frames += 1
+        if frame:
+            self.stream.write(frame)
+            self.stream.flush()
+
+    def close(self):
+        '''
+        Moves the cursor below the last frame and shows it again, so the
+        terminal can be used normally.
+        '''
+        if self.cells != None:
+            self.stream.write(move_cursor(13, 0) + SHOW_CURSOR)
+            self.stream.flush()
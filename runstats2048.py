@@ -0,0 +1,473 @@
+import math
+'''
+This file keeps running statistics about the games played by
+simulategames.py. Every game is added as soon as it ends, and nothing grows
+with the number of games, so the statistics of a run with millions of games
+take no more memory than a run with ten.
+
+Numbers like the final score are kept in a "Distribution", a histogram whose
+buckets get wider as the numbers get larger (each bucket is about 2% wider
+than the last). Quantiles such as the median are read from the histogram and
+are within 1% of the true value. Two histograms with the same accuracy are
+combined by adding their buckets, so the statistics of several worker
+processes can be merged into exactly the statistics of the whole run.
+'''
+
+# Relative accuracy of the quantiles of a Distribution
+ACCURACY = 0.01
+
+# Tile that counts as a win
+WINNING_TILE = 2048
+
+def nearest_rank(fraction, count):
+    '''
+    Returns the rank of a quantile by the nearest rank method: the quantile
+    is the smallest of count numbers with at least that fraction of the
+    numbers at or below it, so the p90 of two numbers is the larger one.
+
+    Perameters:
+        fraction (float): which quantile, e.g. 0.5 for the median
+        count (int): how many numbers there are, at least 1
+
+    Returns:
+        (int): the rank, from 1 for the smallest number to count
+    '''
+    # The small tolerance stops rounding errors like 0.7 * 10 = 7.000...01
+    # from moving the rank up by one
+    return min(count, max(1, math.ceil(fraction * count - 1e-9)))
+
+class Distribution:
+    def __init__(self, accuracy=ACCURACY):
+        '''
+        Creates an empty histogram of non negative numbers.
+
+        Perameters:
+            accuracy (float): relative accuracy of the quantiles, e.g. 0.01
+                for 1%
+        '''
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+        # Number of zeros, and number of values in each bucket. Bucket i
+        # holds the values in (gamma ** (i - 1), gamma ** i].
+        self.zeros = 0
+        self.buckets = {}
+
+    def add(self, value):
+        '''
+        Adds one number to the histogram.
+        '''
+        self.count += 1
+        self.total += value
+        if self.min == None or value < self.min:
+            self.min = value
+        if self.max == None or value > self.max:
+            self.max = value
+        if value <= 0:
+            self.zeros += 1
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other):
+        '''
+        Adds the numbers of another Distribution with the same accuracy to
+        this one.
+        '''
+        if other.accuracy != self.accuracy:
+            raise ValueError('distributions have different accuracies')
+        self.count += other.count
+        self.total += other.total
+        if other.min != None and (self.min == None or other.min < self.min):
+            self.min = other.min
+        if other.max != None and (self.max == None or other.max > self.max):
+            self.max = other.max
+        self.zeros += other.zeros
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def mean(self):
+        '''
+        Returns the mean of the numbers, or None if there are none.
+        '''
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+    def quantile(self, fraction):
+        '''
+        Returns a quantile of the numbers, within the accuracy of the
+        histogram. The quantile is the number at the nearest rank (see
+        "nearest_rank").
+
+        Perameters:
+            fraction (float): which quantile, e.g. 0.5 for the median
+
+        Returns:
+            (float): the quantile, or None if there are no numbers
+        '''
+        if self.count == 0:
+            return None
+        rank = nearest_rank(fraction, self.count)
+        seen = self.zeros
+        if rank <= seen:
+            return 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank <= seen:
+                # The middle of the bucket, in relative terms
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def to_dict(self):
+        '''
+        Returns the histogram as a dict that can be written as JSON.
+        '''
+        return {
+            'accuracy': self.accuracy,
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+            'zeros': self.zeros,
+            'buckets': {str(index): count for index, count in sorted(self.buckets.items())},
+        }
+
+    @staticmethod
+    def from_dict(data):
+        '''
+        Creates a Distribution from the output of "to_dict".
+        '''
+        distribution = Distribution(data['accuracy'])
+        distribution.count = data['count']
+        distribution.total = data['total']
+        distribution.min = data['min']
+        distribution.max = data['max']
+        distribution.zeros = data['zeros']
+        distribution.buckets = {int(index): count for index, count in data['buckets'].items()}
+        return distribution
+
+def wilson_interval(successes, trials, z=1.96):
+    '''
+    Returns the Wilson score interval for a proportion, which stays between
+    0 and 1 and works even when there are few trials or the proportion is
+    near 0 or 1.
+
+    Perameters:
+        successes (int): number of successes
+        trials (int): number of trials
+        z (float): number of standard deviations, 1.96 for 95% confidence
+
+    Returns:
+        (tuple: (float, float)): the lower and upper ends of the interval
+    '''
+    if trials == 0:
+        return 0.0, 1.0
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    center = (p + z * z / (2 * trials)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+def sequential_test(successes, trials, target, margin=0.02, alpha=0.05, beta=None):
+    '''
+    Wald's sequential probability ratio test of whether a proportion is
+    above or below target. It can be checked after every trial, and decides
+    as soon as the trials so far are enough. If the true proportion is at
+    most target - margin, the test wrongly answers 'above' with a chance of
+    at most alpha, and if it is at least target + margin, it wrongly answers
+    'below' with a chance of at most beta. In between, either answer can
+    come out.
+
+    Perameters:
+        successes (int): number of successes
+        trials (int): number of trials
+        target (float): proportion to compare with, e.g. 0.3
+        margin (float): half the width of the region around target where
+            either answer is acceptable
+        alpha (float): chance of answering 'above' when the proportion is
+            below the region
+        beta (float): chance of answering 'below' when the proportion is
+            above the region, alpha if None
+
+    Returns:
+        (str): 'above', 'below', or None if the test hasn't decided yet
+    '''
+    if beta == None:
+        beta = alpha
+    low = target - margin
+    high = target + margin
+    if low <= 0 or high >= 1:
+        raise ValueError('target - margin and target + margin must be between 0 and 1')
+
+    # Log of how much more likely the trials are if the proportion is high
+    # than if it is low
+    ratio = (successes * math.log(high / low) +
+             (trials - successes) * math.log((1 - high) / (1 - low)))
+    if ratio >= math.log((1 - beta) / alpha):
+        return 'above'
+    if ratio <= math.log(beta / (1 - alpha)):
+        return 'below'
+    return None
+
+class RunStats:
+    def __init__(self):
+        '''
+        Creates empty statistics for a run of games.
+        '''
+        self.games = 0
+        self.wins = 0
+        self.wins_above = 0
+
+        # Number of games that ended with each largest tile
+        self.top_tiles = {}
+        self.scores = Distribution()
+        self.moves = Distribution()
+        self.seconds = Distribution()
+
+    def add_game(self, top_tile, score, moves, seconds=None):
+        '''
+        Adds a finished game.
+
+        Perameters:
+            top_tile (int): the largest tile when the game ended
+            score (int): the final score
+            moves (int): number of moves made
+            seconds (float): how long the game took, or None if not known
+        '''
+        self.games += 1
+        if top_tile >= WINNING_TILE:
+            self.wins += 1
+        if top_tile > WINNING_TILE:
+            self.wins_above += 1
+        self.top_tiles[top_tile] = self.top_tiles.get(top_tile, 0) + 1
+        self.scores.add(score)
+        self.moves.add(moves)
+        if seconds != None:
+            self.seconds.add(seconds)
+
+    def merge(self, other):
+        '''
+        Adds the games of another RunStats to this one. The result is the
+        same as if every game had been added here, apart from rounding in
+        the total time.
+        '''
+        self.games += other.games
+        self.wins += other.wins
+        self.wins_above += other.wins_above
+        for tile, count in other.top_tiles.items():
+            self.top_tiles[tile] = self.top_tiles.get(tile, 0) + count
+        self.scores.merge(other.scores)
+        self.moves.merge(other.moves)
+        self.seconds.merge(other.seconds)
+
+    def win_rate(self):
+        '''
+        Returns the fraction of games won, or 0 if no games were played.
+        '''
+        return self.wins / self.games if self.games else 0.0
+
+    def win_interval(self, z=1.96):
+        '''
+        Returns the 95% confidence interval of the win rate (see
+        "wilson_interval").
+        '''
+        return wilson_interval(self.wins, self.games, z)
+
+    def win_test(self, target, margin=0.02, alpha=0.05):
+        '''
+        Tests whether the win rate is above or below target (see
+        "sequential_test").
+
+        Returns:
+            (str): 'above', 'below', or None if the test hasn't decided yet
+        '''
+        return sequential_test(self.wins, self.games, target, margin, alpha)
+
+    def top_tile(self):
+        '''
+        Returns the largest tile reached in any game, or 0 if no games were
+        played.
+        '''
+        return max(self.top_tiles) if self.top_tiles else 0
+
+    def to_dict(self):
+        '''
+        Returns the statistics as a dict that can be written as JSON.
+        '''
+        return {
+            'games': self.games,
+            'wins': self.wins,
+            'wins_above': self.wins_above,
+            'top_tiles': {str(tile): count for tile, count in sorted(self.top_tiles.items())},
+            'scores': self.scores.to_dict(),
+            'moves': self.moves.to_dict(),
+            'seconds': self.seconds.to_dict(),
+        }
+
+    @staticmethod
+    def from_dict(data):
+        '''
+        Creates a RunStats from the output of "to_dict".
+        '''
+        stats = RunStats()
+        stats.games = data['games']
+        stats.wins = data['wins']
+        stats.wins_above = data['wins_above']
+        stats.top_tiles = {int(tile): count for tile, count in data['top_tiles'].items()}
+        stats.scores = Distribution.from_dict(data['scores'])
+        stats.moves = Distribution.from_dict(data['moves'])
+        stats.seconds = Distribution.from_dict(data['seconds'])
+        return stats
+
+class Moments:
+    def __init__(self):
+        '''
+        Creates an empty running count, sum and sum of squares of numbers,
+        enough to give their mean and variance.
+        '''
+        self.count = 0
+        self.total = 0
+        self.squares = 0
+
+    def add(self, value):
+        '''
+        Adds one number.
+        '''
+        self.count += 1
+        self.total += value
+        self.squares += value * value
+
+    def merge(self, other):
+        '''
+        Adds the numbers of another Moments to this one.
+        '''
+        self.count += other.count
+        self.total += other.total
+        self.squares += other.squares
+
+    def mean(self):
+        '''
+        Returns the mean of the numbers, or None if there are none.
+        '''
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+    def variance(self):
+        '''
+        Returns the sample variance of the numbers, or 0 if there are fewer
+        than two.
+        '''
+        if self.count < 2:
+            return 0.0
+        mean = self.total / self.count
+        return max(0.0, (self.squares - self.count * mean * mean) / (self.count - 1))
+
+# Numbers compared by PairedComparison for each game: 1 for a win and 0
+# otherwise, the final score and the exponent of the largest tile (so a
+# difference of 1 means one tile twice as large)
+PAIRED_METRICS = ('win', 'score', 'max_tile')
+
+class PairedComparison:
+    def __init__(self):
+        '''
+        Creates empty statistics for comparing two AIs, A and B, that play
+        the same games in pairs. Like RunStats, nothing grows with the
+        number of games.
+        '''
+        self.games = 0
+        self.a = {metric: Moments() for metric in PAIRED_METRICS}
+        self.b = {metric: Moments() for metric in PAIRED_METRICS}
+        self.differences = {metric: Moments() for metric in PAIRED_METRICS}
+
+        # Pairs where only one of the two AIs won
+        self.only_a_won = 0
+        self.only_b_won = 0
+
+    def add_pair(self, a, b):
+        '''
+        Adds one pair of games.
+
+        Perameters:
+            a (tuple: (int, int)): the largest tile and the final score of
+                the game played by A
+            b (tuple: (int, int)): the same for the game played by B
+        '''
+        values_a = pair_values(*a)
+        values_b = pair_values(*b)
+        self.games += 1
+        for metric in PAIRED_METRICS:
+            self.a[metric].add(values_a[metric])
+            self.b[metric].add(values_b[metric])
+            self.differences[metric].add(values_a[metric] - values_b[metric])
+        if values_a['win'] > values_b['win']:
+            self.only_a_won += 1
+        elif values_b['win'] > values_a['win']:
+            self.only_b_won += 1
+
+    def merge(self, other):
+        '''
+        Adds the pairs of another PairedComparison to this one.
+        '''
+        self.games += other.games
+        for metric in PAIRED_METRICS:
+            self.a[metric].merge(other.a[metric])
+            self.b[metric].merge(other.b[metric])
+            self.differences[metric].merge(other.differences[metric])
+        self.only_a_won += other.only_a_won
+        self.only_b_won += other.only_b_won
+
+    def difference(self, metric):
+        '''
+        Returns the mean of A minus B for one of PAIRED_METRICS, or None if
+        no games were played.
+        '''
+        return self.differences[metric].mean()
+
+    def paired_interval(self, metric, z=1.96):
+        '''
+        Returns the 95% confidence interval of the mean difference, from the
+        spread of the differences between the two games of each pair.
+
+        Returns:
+            (tuple: (float, float)): the lower and upper ends of the interval
+        '''
+        differences = self.differences[metric]
+        if differences.count == 0:
+            return None
+        half_width = z * math.sqrt(differences.variance() / differences.count)
+        return differences.mean() - half_width, differences.mean() + half_width
+
+    def unpaired_interval(self, metric, z=1.96):
+        '''
+        Returns the 95% confidence interval the mean difference would have
+        if A and B had played different games, for comparison with
+        "paired_interval".
+
+        Returns:
+            (tuple: (float, float)): the lower and upper ends of the interval
+        '''
+        a = self.a[metric]
+        b = self.b[metric]
+        if a.count == 0:
+            return None
+        half_width = z * math.sqrt(a.variance() / a.count + b.variance() / b.count)
+        difference = a.mean() - b.mean()
+        return difference - half_width, difference + half_width
+
+def pair_values(top_tile, score):
+    '''
+    Returns the numbers PairedComparison compares for one game.
+    '''
+    return {
+        'win': 1 if top_tile >= WINNING_TILE else 0,
+        'score': score,
+        'max_tile': top_tile.bit_length() - 1 if top_tile else 0,
+    }
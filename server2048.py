@@ -0,0 +1,237 @@
+from classes2048 import Game2048
+from classes2048 import Direction
+from classes2048 import MOVE_BITS
+from classes2048 import suggest_position
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import asyncio
+import json
+import random
+import time
+HOST = '127.0.0.1'
+PORT = 2048
+IDLE_TIMEOUT = 600
+MAX_SESSIONS = 10000
+'''
+File runs a server that hosts many games of 2048 at the same time, for
+people or bots playing over the network. It uses asyncio, so thousands of
+connections can be open at once in one process.
+
+Clients connect over TCP and send one JSON request per line. The server sends
+back one JSON response per line, in the same order. Every request has an "op":
+    1. {"op": "create", "seed": 1}: starts a new game (the seed is optional)
+       and returns its "session" id
+    2. {"op": "move", "session": "...", "direction": "LEFT"}: makes a move
+    3. {"op": "suggest", "session": "..."}: returns the move the AI suggests
+       in "direction", without making it
+    4. {"op": "state", "session": "..."}: returns the board and score
+    5. {"op": "close", "session": "..."}: ends a game
+Responses have "ok": true and the "board", "score", "game_over", "won" and
+possible "moves" of the game, or "ok": false and an "error". An "id" in a
+request is copied into its response. Moves that don't change the board are
+refused, like in TUI.py, and the AI sometimes suggests one of these, so bots
+should check the suggestion against "moves".
+
+Suggesting a move takes much longer than anything else, so suggestions are
+made in a pool of worker processes and the server keeps answering other
+requests in the meantime. Each game has a lock, so two requests for the same
+game never run at the same time. Games that get no requests for a while are
+removed.
+
+The load generator in loadtest2048.py can be used to measure how many moves
+per second the server handles and how long suggestions take.
+'''
+
+class Session:
+    def __init__(self, session_id, seed=None):
+        '''
+        Creates a game hosted by the server, with the two pieces every game
+        starts with.
+
+        Perameters:
+            session_id (str): id the clients use for the game
+            seed (int): seed for the game's random numbers, or None for a
+                random seed
+        '''
+        self.session_id = session_id
+        self.game = Game2048('bitboard', random.Random(seed))
+        self.game.add_random_piece(self.game.board)
+        self.game.add_random_piece(self.game.board)
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+    def state(self):
+        '''
+        Returns the state of the game to send to the client.
+        '''
+        mask = self.game.legal_moves(self.game.board)
+        return {
+            'session': self.session_id,
+            'board': self.game.board,
+            'score': self.game.score,
+            'game_over': self.game.is_game_over(),
+            'won': self.game.is_game_won(),
+            'moves': [direction.name for direction in Direction if mask & MOVE_BITS[direction]],
+        }
+
+class GameServer:
+    def __init__(self, workers=None, idle_timeout=IDLE_TIMEOUT, max_sessions=MAX_SESSIONS):
+        '''
+        Creates a server. Nothing is started until "serve" is called.
+
+        Perameters:
+            workers (int): number of processes that suggest moves. Uses one
+                per CPU if None, and suggests moves in a thread of this
+                process if 0.
+            idle_timeout (float): seconds without a request after which a
+                game is removed
+            max_sessions (int): most games hosted at once
+        '''
+        self.workers = workers
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self.next_id = 0
+        self.executor = None
+        self.requests = 0
+        self.evicted = 0
+
+    async def serve(self, host=HOST, port=PORT):
+        '''
+        Accepts connections until the task is cancelled.
+        '''
+        if self.workers != 0:
+            self.executor = ProcessPoolExecutor(self.workers)
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        evictor = asyncio.ensure_future(self.evict_idle_sessions())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            evictor.cancel()
+            if self.executor != None:
+                self.executor.shutdown()
+
+    async def handle_connection(self, reader, writer):
+        '''
+        Answers the requests sent on one connection, one at a time.
+        '''
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self.handle_line(line)
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            # ValueError is raised for lines that are too long
+            pass
+        finally:
+            writer.close()
+
+    async def handle_line(self, line):
+        '''
+        Returns the response to one line sent by a client.
+        '''
+        self.requests += 1
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('request must be a JSON object')
+        except ValueError as error:
+            return {'ok': False, 'error': 'bad request: ' + str(error)}
+
+        try:
+            response = await self.handle_request(request)
+        except (TypeError, ValueError) as error:
+            response = {'ok': False, 'error': str(error)}
+        if 'id' in request:
+            response['id'] = request['id']
+        return response
+
+    async def handle_request(self, request):
+        '''
+        Carries out one request and returns the response. Raises TypeError
+        or ValueError if the request can't be carried out.
+        '''
+        op = request.get('op')
+        if op == 'create':
+            if len(self.sessions) >= self.max_sessions:
+                raise ValueError('too many sessions')
+            session_id = str(self.next_id)
+            self.next_id += 1
+            session = Session(session_id, request.get('seed'))
+            self.sessions[session_id] = session
+            return dict(session.state(), ok=True)
+
+        session = self.sessions.get(request.get('session'))
+        if session == None:
+            raise ValueError('unknown session ' + repr(request.get('session')))
+        session.last_used = time.monotonic()
+
+        async with session.lock:
+            # The session may have been closed or evicted while this request
+            # waited for the lock
+            if self.sessions.get(session.session_id) is not session:
+                raise ValueError('unknown session ' + repr(request.get('session')))
+            game = session.game
+            if op == 'state':
+                return dict(session.state(), ok=True)
+            elif op == 'close':
+                self.sessions.pop(session.session_id, None)
+                return {'ok': True, 'session': session.session_id}
+            elif op == 'move':
+                direction = Direction.__members__.get(str(request.get('direction')).upper())
+                if direction == None:
+                    raise ValueError('unknown direction ' + repr(request.get('direction')))
+                if not game.is_move_possible(direction, game.board):
+                    raise ValueError('move not possible')
+                game.move(direction, game.board)
+                return dict(session.state(), ok=True)
+            elif op == 'suggest':
+                if game.is_game_over():
+                    raise ValueError('game over')
+                task = (game.copy_board(), game.score, game.last_move_up,
+                        game.ai_rng.getrandbits(32))
+                loop = asyncio.get_running_loop()
+                direction, game.last_move_up = await loop.run_in_executor(
+                    self.executor, suggest_position, task)
+                return dict(session.state(), ok=True, direction=direction.name)
+            raise ValueError('unknown op ' + repr(op))
+
+    async def evict_idle_sessions(self):
+        '''
+        Removes games that haven't had a request for idle_timeout seconds.
+        Games that are busy with a request are left alone.
+        '''
+        while True:
+            await asyncio.sleep(min(self.idle_timeout, 60))
+            cutoff = time.monotonic() - self.idle_timeout
+            for session_id, session in list(self.sessions.items()):
+                if session.last_used < cutoff and not session.lock.locked():
+                    del self.sessions[session_id]
+                    self.evicted += 1
+
+def main():
+    parser = argparse.ArgumentParser(description='Host games of 2048 over TCP.')
+    parser.add_argument('--host', default=HOST, help='address to listen on')
+    parser.add_argument('--port', type=int, default=PORT, help='port to listen on')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes that suggest moves (default: one per CPU, '
+                             '0 for a thread of the server process)')
+    parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT,
+                        help='seconds after which a game with no requests is removed')
+    parser.add_argument('--max-sessions', type=int, default=MAX_SESSIONS,
+                        help='most games hosted at once')
+    args = parser.parse_args()
+
+    server = GameServer(args.workers, args.idle_timeout, args.max_sessions)
+    print("Serving 2048 on", args.host + ":" + str(args.port), flush=True)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -1,74 +1,703 @@
 from classes2048 import Game2048
+from classes2048 import EvaluationCache
+from classes2048 import SearchStats
+from classes2048 import HeuristicWeights
+from classes2048 import DEFAULT_WEIGHTS
+from records2048 import RecordBuffer
+from records2048 import RecordWriter
+from runstats2048 import RunStats
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import os
+import random
+import time
 NUM_GAMES = 1000
+BACKEND = 'bitboard'
+BATCH_SIZE = 10000
+STOP_BATCH_SIZE = 500
+EXPECTIMAX_DEPTH = 2
+MAX_CHUNK_SIZE = 1000
+CHECKPOINT_EVERY = 100
+TEST_MARGIN = 0.02
+TEST_ERROR = 0.05
 '''
 File simulates 1000 games of 2048 where each move is suggested by the
 "suggest move" method in the Game2048 class.
 
-After the 1000 games are simulated, information about the games played is 
+After the 1000 games are simulated, information about the games played is
 printed to standard output:
     1. The number of games played
     2. The number of wins
     3. The number of wins greater than 2048
     4. The top tile from all the games
-    5. The percentage of wins
+    5. The percentage of wins, with a 95% confidence interval
+    6. How many games ended with each top tile
+    7. The mean, median, 90th and 99th percentile of the final score, the
+       number of moves and the time taken by each game
+
+Games are added to these statistics as soon as they end (see runstats2048.py),
+so memory use doesn't grow with the number of games. With --report-every the
+statistics so far are printed every so many games.
+
+With the --seed option every game gets its own random number generators
+seeded from the master seed and the index of the game, so a run can be
+repeated exactly. The pieces added to the board and the AI's own random
+choices come from two separate generators, so game i gets the same twos and
+fours in the same order whatever moves the AI makes, placed with the same
+random keys (see "choose_random_piece" in classes2048.py). AIs with
+different settings can then be compared on closely matched games (see
+tune2048.py and ab2048.py). The --workers option splits the games across a
+pool of processes. Results are put back in game order, so for a fixed seed
+the output is the same for any number of workers.
+
+The --cache-size option shares a cache of suggested moves between all the
+games played by a process. Suggestions from the cache come from the first
+time a position was searched, so with more than one worker the results
+depend on which games each worker played.
+
+The --ai option chooses the AI that plays the games: 'default' uses
+"suggest_move" and 'expectimax' uses "suggest_move_expectimax" with the
+search depth given by --depth.
+
+The --stats option counts the work the AI does for every move (see
+SearchStats in classes2048.py) and prints a breakdown for every game and for
+the whole run. --stats-json writes the same numbers to a file as JSON.
+
+The --record option saves every game (its seed, moves, random pieces, final
+score and largest tile) to a binary record file as soon as the game ends, see
+records2048.py. Games are added to the end of the file if it already exists.
+
+The --checkpoint option saves the statistics of the finished games to a file
+every --checkpoint-every games. If the run is stopped, running the same
+command again with --resume continues from the last checkpoint and gives the
+same statistics as a run that was never stopped (apart from the time taken by
+each game). Every game is seeded from the master seed and its index, so the
+checkpoint only needs the master seed and the statistics: the index of the
+next game is the number of games finished. Games recorded with --record after
+the last checkpoint are removed from the record file when the run resumes.
+
+With the --batch option the games are played by the numpy batch simulator in
+batch2048.py, which plays many games at the same time.
+
+A run can stop before --games games are played once the win rate is known
+well enough. With --ci-width the run stops when the 95% confidence interval
+of the win rate is narrower than the given width (e.g. 0.05 for plus or
+minus 2.5%). With --target the run stops when a sequential test decides
+whether the win rate is above or below the target (e.g. 0.3): if the win
+rate is more than --margin away from the target, the answer is wrong at
+most 5% of the time (--error), however early the test stops. Either way,
+the output says how many games were played and why the run stopped. The
+rules are checked after every game (every chunk with --workers and every
+batch with --batch, where batches are then at most 500 games so the run can
+stop soon enough), and --games is the most games the run plays.
 '''
 
-def num_wins(top_tiles):
+def game_seed(master_seed, game_index):
     '''
-    Takes a last of top tiles and returns the number of them that are
-    2048 or greater
+    Returns the seed for the random number generator of one game.
 
     Perameters:
-        top_tiles (list of int): The top value of tiles from each game played
-    
+        master_seed (int): seed for the whole run
+        game_index (int): index of the game in the run
+
     Returns:
-        count_2048 (int): Number of games where the top tile was 2048 or greater
+        (str): seed for random.Random
     '''
-    count_2048 = 0
-    for tile in top_tiles:
-        if tile >= 2048:
-            count_2048 += 1
-    
-    return (count_2048)
+    return str(master_seed) + ':' + str(game_index)
 
-def wins_greater_than_2048(top_tiles):
+def play_game(rng=None, cache=None, ai='default', depth=EXPECTIMAX_DEPTH,
+              stats=None, writer=None, seed=None, results=None, weights=None,
+              ai_rng=None):
     '''
-    Takes a list of top tiles and returns the number of tiles that are
-    greater than 2048.
+    Plays one game using the moves suggested by the AI.
 
     Perameters:
-        top_tiles (list of int): The top value of tiles from each game played
-    
+        rng (random.Random): Source of random numbers for the game. Uses
+            the global random module if None.
+        cache (EvaluationCache): Cache of suggested moves shared by the games
+        ai (str): 'default' or 'expectimax'
+        depth (int): search depth for the expectimax AI
+        stats (SearchStats): counters updated by every suggested move, or
+            None to not collect them
+        writer (RecordWriter): if not None, the game is recorded and written
+            to it when it ends
+        seed (str): seed saved with the record of the game
+        results (RunStats): if not None, the game is added to it when it ends
+        weights (HeuristicWeights): weights used by the default AI, or None
+            for the defaults
+        ai_rng (random.Random): Source of random numbers for the AI, or None
+            to use rng
+
     Returns:
-        count_2048 (int): Number of games where the top tile was greater than 2048
+        (int): the largest piece on the board when the game ended
     '''
-    rv = []
-    for tile in top_tiles:
-        if tile > 2048:
-            rv.append(tile)
-    return rv
-
-top_tiles = []
-
-for i in range(NUM_GAMES):
-    game = Game2048()
+    start = time.perf_counter()
+    game = Game2048(BACKEND, rng, cache, stats, writer != None, weights, ai_rng)
+    moves = 0
 
     # Game starts with two pieces on the board
     game.add_random_piece(game.board)
     game.add_random_piece(game.board)
 
     while not game.is_game_over():
-        game.move(game.suggest_move(), game.board)
-    
-    largest_piece = game.get_largest_piece()
-    top_tiles.append(largest_piece)
+        if ai == 'expectimax':
+            game.move(game.suggest_move_expectimax(depth), game.board)
+        else:
+            game.move(game.suggest_move(), game.board)
+        moves += 1
+
+    if writer != None:
+        writer.write_game(seed, game)
+    if results != None:
+        results.add_game(game.get_largest_piece(), game.score, moves,
+                         time.perf_counter() - start)
+    return game.get_largest_piece()
+
+def play_games(num_games, master_seed=None, start=0, cache=None, ai='default',
+               depth=EXPECTIMAX_DEPTH, game_stats=None, writer=None, results=None,
+               progress=None, weights=None):
+    '''
+    Plays num_games games one at a time and returns statistics about them.
+
+    Perameters:
+        num_games (int): number of games to play
+        master_seed (int): seed for the run, or None to use the global
+            random module. Game i's pieces are seeded with game_seed(master_seed, i)
+            and the AI's random numbers with that seed + ':ai'.
+        start (int): index of the first game, used to seed each game
+        cache (EvaluationCache): Cache of suggested moves shared by the games
+        ai (str): 'default' or 'expectimax'
+        depth (int): search depth for the expectimax AI
+        game_stats (list): if not None, the SearchStats of each game is
+            appended to it
+        writer (RecordWriter): if not None, every game is recorded and
+            written to it as soon as it ends
+        results (RunStats): statistics the games are added to, or None to
+            start new ones
+        progress (function): if not None, called with results after every
+            game (see "Progress"). The run stops early if it returns True.
+        weights (HeuristicWeights): weights used by the default AI, or None
+            for the defaults
+
+    Returns:
+        results (RunStats): statistics about the games played
+    '''
+    if results == None:
+        results = RunStats()
+
+    for i in range(start, start + num_games):
+        rng = None
+        ai_rng = None
+        seed = None
+        if master_seed != None:
+            seed = game_seed(master_seed, i)
+            rng = random.Random(seed)
+            ai_rng = random.Random(seed + ':ai')
+        stats = None
+        if game_stats != None:
+            stats = SearchStats()
+            game_stats.append(stats)
+        play_game(rng, cache, ai, depth, stats, writer, seed, results, weights, ai_rng)
+        if progress != None and progress(results):
+            break
+
+    return results
+
+# Cache shared by all the chunks played in one worker process
+worker_cache = None
+
+def play_chunk(chunk):
+    '''
+    Plays one chunk of a run inside a worker process.
+
+    Perameters:
+        chunk (tuple: (int, int, int, dict)): (start, num_games, master_seed,
+            settings), where settings holds the 'cache_size' (None for no
+            cache), 'ai', 'depth', 'stats' (whether to collect
+            SearchStats), 'record' (whether to record the games) and
+            'weights' (HeuristicWeights or None) used for every game
+
+    Returns:
+        (tuple: (RunStats, list, list)): Statistics about the games played,
+            the SearchStats of each game, or None without stats, and the
+            record of each game, or None if games aren't recorded
+    '''
+    global worker_cache
+    start, num_games, master_seed, settings = chunk
+    if settings['cache_size'] != None and worker_cache == None:
+        worker_cache = EvaluationCache(settings['cache_size'])
+    game_stats = [] if settings['stats'] else None
+    buffer = RecordBuffer() if settings['record'] else None
+    results = play_games(num_games, master_seed, start, worker_cache,
+                         settings['ai'], settings['depth'], game_stats, buffer,
+                         weights=settings.get('weights'))
+    return results, game_stats, buffer.records if buffer != None else None
+
+def play_games_parallel(num_games, master_seed, workers, settings, game_stats=None,
+                        writer=None, results=None, progress=None):
+    '''
+    Plays num_games games split across a pool of worker processes. Games are
+    seeded by their index, so the result does not depend on the number of
+    workers.
+
+    Perameters:
+        num_games (int): number of games to play
+        master_seed (int): seed for the run
+        workers (int): number of worker processes
+        settings (dict): 'cache_size' (None for no cache), 'ai', 'depth',
+            'stats', 'record' and 'weights'
+        game_stats (list): if not None, the SearchStats of each game is
+            appended to it, in game order
+        writer (RecordWriter): if not None, the records of the games are
+            written to it in game order as each chunk finishes
+        results (RunStats): statistics the games are added to, or None to
+            start new ones. The index of the first game played is the number
+            of games already in results.
+        progress (function): if not None, called with results after every
+            chunk of games (see "Progress"). The run stops early if it
+            returns True, and chunks that haven't started are cancelled.
+
+    Returns:
+        results (RunStats): statistics about the games played
+    '''
+    if results == None:
+        results = RunStats()
+    first = results.games
+
+    # Several chunks per worker keep the workers busy when some games run
+    # longer than others, and chunks are kept small enough that results
+    # come back regularly during long runs.
+    num_chunks = max(min(num_games, workers * 4), -(-num_games // MAX_CHUNK_SIZE))
+    chunks = []
+    for i in range(num_chunks):
+        start = num_games * i // num_chunks
+        stop = num_games * (i + 1) // num_chunks
+        chunks.append((first + start, stop - start, master_seed, settings))
+
+    # Chunks come back in order, so results always holds the first games of
+    # the run.
+    with ProcessPoolExecutor(workers) as pool:
+        for chunk_results, chunk_stats, chunk_records in pool.map(play_chunk, chunks):
+            results.merge(chunk_results)
+            if game_stats != None:
+                game_stats.extend(chunk_stats)
+            if writer != None:
+                for record in chunk_records:
+                    writer.write_record(record)
+            if progress != None and progress(results):
+                pool.shutdown(cancel_futures=True)
+                break
+    return results
+
+def save_checkpoint(path, settings, results, num_records=None):
+    '''
+    Saves a checkpoint of a run. The checkpoint is written to a temporary
+    file which then replaces the old checkpoint, so the file always holds
+    either the old or the new checkpoint, even if the program is stopped
+    while writing it.
+
+    Perameters:
+        path (str): the checkpoint file
+        settings (dict): settings of the run that a resumed run must match,
+            including the 'master_seed'
+        results (RunStats): statistics about the games finished so far
+        num_records (int): number of games in the record file, or None if
+            games aren't recorded
+    '''
+    checkpoint = {
+        'settings': settings,
+        'results': results.to_dict(),
+        'num_records': num_records,
+    }
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def load_checkpoint(path):
+    '''
+    Loads a checkpoint saved by "save_checkpoint".
+
+    Returns:
+        (tuple: (dict, RunStats, int)): the settings, the statistics and the
+            number of recorded games
+    '''
+    with open(path) as f:
+        checkpoint = json.load(f)
+    return (checkpoint['settings'], RunStats.from_dict(checkpoint['results']),
+            checkpoint['num_records'])
+
+class Progress:
+    def __init__(self, results, report_every=None, checkpoint=None,
+                 checkpoint_every=CHECKPOINT_EVERY, settings=None, writer=None,
+                 stop=None):
+        '''
+        Creates the function called by play_games as games finish, which
+        prints the results so far, saves checkpoints and says whether the run
+        can stop early.
+
+        Perameters:
+            results (RunStats): statistics the run starts from
+            report_every (int): print the results every this many games, or
+                None to not print them
+            checkpoint (str): checkpoint file, or None to not save
+                checkpoints
+            checkpoint_every (int): save a checkpoint every this many games
+            settings (dict): settings saved with each checkpoint
+            writer (RecordWriter): record file the games are written to, or
+                None
+            stop (function): called with the results so far, returns why the
+                run can stop (str), or None to keep going. Never stops early
+                if None.
+        '''
+        self.report_every = report_every
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.settings = settings
+        self.writer = writer
+        self.reported = results.games
+        self.saved = results.games
+        self.stop = stop
+        self.stop_reason = None
+
+    def __call__(self, results):
+        '''
+        Reports and saves results as needed. Returns True if the run can
+        stop, with the reason in self.stop_reason.
+        '''
+        if (self.report_every != None and
+                results.games // self.report_every > self.reported // self.report_every):
+            print_progress(results)
+            self.reported = results.games
+        if self.checkpoint != None and results.games - self.saved >= self.checkpoint_every:
+            self.save(results)
+        if self.stop != None:
+            self.stop_reason = self.stop(results)
+        return self.stop_reason != None
+
+    def save(self, results):
+        '''
+        Saves a checkpoint of results. The record file is flushed first, so
+        it always holds at least the games in the checkpoint.
+        '''
+        num_records = None
+        if self.writer != None:
+            self.writer.flush()
+            num_records = len(self.writer)
+        save_checkpoint(self.checkpoint, self.settings, results, num_records)
+        self.saved = results.games
+
+def stop_reason(results, ci_width=None, target=None, margin=TEST_MARGIN, error=TEST_ERROR):
+    '''
+    Checks the rules for stopping a run early.
+
+    Perameters:
+        results (RunStats): statistics about the games played so far
+        ci_width (float): stop once the 95% confidence interval of the win
+            rate is at most this wide, or None for no limit
+        target (float): stop once a sequential test decides whether the win
+            rate is above or below this, or None for no test
+        margin (float): how far from target the win rate must be for the
+            test's error rate to hold (see runstats2048.sequential_test)
+        error (float): chance of the test giving the wrong answer
+
+    Returns:
+        (str): why the run can stop, or None if it should keep going
+    '''
+    if ci_width != None:
+        low, high = results.win_interval()
+        if high - low <= ci_width:
+            return ("the 95% confidence interval of the win rate is " +
+                    str(round(100 * (high - low), 2)) + "% wide")
+    if target != None:
+        decision = results.win_test(target, margin, error)
+        if decision != None:
+            return "the win rate is " + decision + " " + str(round(100 * target, 2)) + "%"
+    return None
+
+def print_progress(results):
+    '''
+    Prints a one line summary of the games played so far to standard output.
+
+    Perameters:
+        results (RunStats): statistics about the games played so far
+    '''
+    low, high = results.win_interval()
+    print("Games:", results.games, "wins:", results.wins,
+          "win rate:", str(round(results.win_rate() * 100, 2)) + "%",
+          "(95% CI " + str(round(low * 100, 2)) + "-" + str(round(high * 100, 2)) + "%)",
+          "median score:", round(results.scores.quantile(0.5)), flush=True)
+
+def print_distribution(name, distribution, digits=0):
+    '''
+    Prints the mean and some percentiles of a Distribution to standard output.
+    '''
+    if distribution.count == 0:
+        return
+    values = [distribution.mean(), distribution.quantile(0.5), distribution.quantile(0.9),
+              distribution.quantile(0.99), distribution.max]
+    values = [round(value, digits) if digits else round(value) for value in values]
+    print(name + ":", "mean", values[0], "p50", values[1], "p90", values[2],
+          "p99", values[3], "max", values[4])
+
+def print_results(results):
+    '''
+    Prints information about the games played to standard output.
+
+    Perameters:
+        results (RunStats): statistics about the games played
+    '''
+    low, high = results.win_interval()
+
+    print("Output:")
+    print("Number of games played:", results.games)
+    print("Number of wins:", results.wins)
+    print("Number of wins greater than 2048:", results.wins_above)
+    print("Top tile", results.top_tile())
+    print("Percentage of wins", str(results.win_rate() * 100) + "%",
+          "(95% confidence interval " + str(round(low * 100, 2)) + "% to " +
+          str(round(high * 100, 2)) + "%)")
+    print("Top tiles:", ", ".join(str(tile) + ": " + str(count)
+                                  for tile, count in sorted(results.top_tiles.items())))
+    print_distribution("Score", results.scores)
+    print_distribution("Moves", results.moves)
+    print_distribution("Seconds per game", results.seconds, 3)
+
+def total_search_stats(game_stats):
+    '''
+    Returns the search stats of the whole run.
+
+    Perameters:
+        game_stats (list of SearchStats): stats of each game played
+
+    Returns:
+        total (SearchStats): the stats of every game merged together
+    '''
+    total = SearchStats()
+    for stats in game_stats:
+        total.merge(stats)
+    return total
+
+def print_search_stats(game_stats, total):
+    '''
+    Prints the search stats of every game and of the whole run to standard
+    output.
+
+    Perameters:
+        game_stats (list of SearchStats): stats of each game played
+        total (SearchStats): stats of the whole run (see "total_search_stats")
+    '''
+    print("Search stats:")
+    for i, stats in enumerate(game_stats):
+        info = stats.to_dict()
+        print("Game", i, "moves", info['calls'],
+              "mean ms", round(info['mean_ms'], 3), "max ms", round(info['max_ms'], 3),
+              "sequences", info['counts']['sequences'], "nodes", info['counts']['nodes'])
+
+    info = total.to_dict()
+    counts = info['counts']
+    print("All games: moves", info['calls'], "seconds", round(info['seconds'], 3),
+          "mean ms", round(info['mean_ms'], 3), "max ms", round(info['max_ms'], 3))
+    print("Branches:", ", ".join(branch + " " + str(count)
+                                 for branch, count in info['branches'].items()))
+    print("Sequences scored:", counts['sequences'], "nodes:", counts['nodes'],
+          "moves:", counts['moves'], "copies:", counts['copies'])
+    print("Ordered bottom row hit rate:", round(info['ordered_hit_rate'], 4),
+          "seconds:", round(counts['row_seconds'], 3))
+    print("Largest in corner hit rate:", round(info['corner_hit_rate'], 4),
+          "seconds:", round(counts['corner_seconds'], 3))
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate games of 2048 played by the AI.')
+    parser.add_argument('--games', type=int, default=NUM_GAMES,
+                        help='number of games to play')
+    parser.add_argument('--batch', action='store_true',
+                        help='play the games with the numpy batch simulator')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help='games played at the same time with --batch (at most ' +
+                             str(STOP_BATCH_SIZE) + ' with --ci-width or --target)')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='master seed that makes the run repeatable')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes used to play the games')
+    parser.add_argument('--cache-size', type=int, default=None,
+                        help='cache up to this many suggested moves per process')
+    parser.add_argument('--ai', choices=['default', 'expectimax'], default='default',
+                        help='AI that chooses the moves')
+    parser.add_argument('--depth', type=int, default=EXPECTIMAX_DEPTH,
+                        help='search depth for the expectimax AI')
+    parser.add_argument('--stats', action='store_true',
+                        help='print how much work the AI did for each game')
+    parser.add_argument('--stats-json', default=None,
+                        help='write the stats of each game and the run to this file')
+    parser.add_argument('--record', default=None,
+                        help='save every game to this binary record file')
+    parser.add_argument('--report-every', type=int, default=None,
+                        help='print the results so far every this many games '
+                             '(after every batch with --batch)')
+    parser.add_argument('--checkpoint', default=None,
+                        help='save the results so far to this file as the run goes')
+    parser.add_argument('--checkpoint-every', type=int, default=CHECKPOINT_EVERY,
+                        help='games between checkpoints (checkpoints are saved after '
+                             'every chunk with --workers and every batch with --batch)')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue from the checkpoint file if there is one')
+    parser.add_argument('--weights', default=None,
+                        help='JSON file with the weights of the default AI, '
+                             'for example the output of tune2048.py')
+    parser.add_argument('--ci-width', type=float, default=None,
+                        help='stop once the 95%% confidence interval of the win rate '
+                             'is at most this wide')
+    parser.add_argument('--target', type=float, default=None,
+                        help='stop once a sequential test decides whether the win '
+                             'rate is above or below this')
+    parser.add_argument('--margin', type=float, default=TEST_MARGIN,
+                        help='win rates within this of --target may be called '
+                             'either way (default: %(default)s)')
+    parser.add_argument('--error', type=float, default=TEST_ERROR,
+                        help='chance that the test with --target gives the wrong '
+                             'answer (default: %(default)s)')
+    args = parser.parse_args()
+
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+    if args.report_every != None and args.report_every < 1:
+        parser.error('--report-every must be at least 1')
+    if args.checkpoint_every < 1:
+        parser.error('--checkpoint-every must be at least 1')
+    if args.resume and args.checkpoint == None:
+        parser.error('--resume needs --checkpoint')
+    if args.ci_width != None and not 0 < args.ci_width < 1:
+        parser.error('--ci-width must be between 0 and 1')
+    if args.target != None and not 0 < args.target - args.margin < args.target + args.margin < 1:
+        parser.error('--target - --margin and --target + --margin must be between 0 and 1')
+    if not 0 < args.error < 0.5:
+        parser.error('--error must be between 0 and 0.5')
+    if args.checkpoint != None and args.cache_size != None:
+        # Cached moves depend on the games played before, which a resumed
+        # run hasn't played
+        parser.error('--cache-size cannot be used with --checkpoint')
+
+    weights = None
+    if args.weights != None:
+        with open(args.weights) as f:
+            data = json.load(f)
+        # The output of tune2048.py holds the weights along with its results
+        weights = HeuristicWeights.from_dict(data.get('weights', data))
+
+    batch_size = args.batch_size
+    if args.ci_width != None or args.target != None:
+        # The stopping rules are checked after every batch
+        batch_size = min(batch_size, STOP_BATCH_SIZE)
+
+    # Settings a resumed run must share with the run that saved the
+    # checkpoint
+    settings = {'ai': args.ai, 'depth': args.depth, 'batch': args.batch,
+                'batch_size': batch_size if args.batch else None,
+                'backend': BACKEND, 'master_seed': args.seed,
+                'weights': weights.to_dict() if weights != None else None}
+    results = RunStats()
+    num_records = None
+    if args.resume and os.path.exists(args.checkpoint):
+        saved_settings, results, num_records = load_checkpoint(args.checkpoint)
+        for name in settings:
+            if name != 'master_seed' and saved_settings.get(name) != settings[name]:
+                parser.error('checkpoint was saved with a different ' + name + ': ' +
+                             repr(saved_settings.get(name)))
+        if args.seed != None and args.seed != saved_settings['master_seed']:
+            parser.error('checkpoint was saved with --seed ' + str(saved_settings['master_seed']))
+        settings['master_seed'] = saved_settings['master_seed']
+        print("Resuming after", results.games, "games")
+    elif args.checkpoint != None and settings['master_seed'] == None:
+        # A resumed run has to play the same games, so the seed is chosen now
+        # and saved in the checkpoint
+        settings['master_seed'] = random.randrange(2 ** 32)
+    num_games = max(0, args.games - results.games)
+
+    stop = None
+    if args.ci_width != None or args.target != None:
+        def stop(results):
+            return stop_reason(results, args.ci_width, args.target, args.margin, args.error)
+        # A resumed run may already have enough games
+        if stop(results) != None:
+            num_games = 0
+
+    cache = None
+    game_stats = None
+    if args.stats or args.stats_json != None:
+        game_stats = []
+    if args.batch:
+        if args.workers != 1:
+            parser.error('--workers cannot be used with --batch')
+        if args.ai != 'default':
+            parser.error('--batch only plays with the default AI')
+        if game_stats != None:
+            parser.error('--stats cannot be used with --batch')
+        if args.record != None:
+            parser.error('--record cannot be used with --batch')
+        import batch2048
+        progress = Progress(results, args.report_every, args.checkpoint, 1, settings,
+                            stop=stop)
+        if num_games > 0:
+            batch2048.play_games(args.games, batch_size, settings['master_seed'],
+                                 results, progress,
+                                 weights if weights != None else DEFAULT_WEIGHTS)
+        if args.checkpoint != None:
+            progress.save(results)
+    else:
+        writer = None
+        if args.record != None:
+            writer = RecordWriter(args.record, num_records)
+        progress = Progress(results, args.report_every, args.checkpoint,
+                            args.checkpoint_every, settings, writer, stop)
+        try:
+            if args.workers > 1:
+                master_seed = settings['master_seed']
+                if master_seed == None:
+                    master_seed = random.randrange(2 ** 32)
+                chunk_settings = {'cache_size': args.cache_size, 'ai': args.ai,
+                                  'depth': args.depth, 'stats': game_stats != None,
+                                  'record': writer != None, 'weights': weights}
+                play_games_parallel(num_games, master_seed, args.workers,
+                    chunk_settings, game_stats, writer, results, progress)
+            else:
+                if args.cache_size != None:
+                    cache = EvaluationCache(args.cache_size)
+                play_games(num_games, settings['master_seed'], results.games, cache,
+                           args.ai, args.depth, game_stats, writer, results, progress,
+                           weights)
+            if args.checkpoint != None:
+                progress.save(results)
+        finally:
+            if writer != None:
+                writer.close()
+
+    print_results(results)
+    if stop != None:
+        reason = stop(results)
+        if reason != None and results.games < args.games:
+            print("Stopped early after", results.games, "of", args.games, "games:", reason)
+        elif reason != None:
+            print("Played", results.games, "games:", reason)
+        else:
+            print("Played all", results.games, "games without reaching the stopping rule")
 
-num_wins = num_wins(top_tiles)
+    if cache != None:
+        stats = cache.stats()
+        print("Cache hits:", stats['hits'], "misses:", stats['misses'],
+              "evictions:", stats['evictions'])
 
-print("Output:")
-print("Number of games played:", NUM_GAMES)
-print("Number of wins:", num_wins)
-print("Number of wins greater than 2048:", len(wins_greater_than_2048(top_tiles)))
-print("Top tile", max(top_tiles))
-print("Percentage of wins", str((num_wins / NUM_GAMES) * 100) + "%")
+    if game_stats != None:
+        total = total_search_stats(game_stats)
+        if args.stats:
+            print_search_stats(game_stats, total)
+        if args.stats_json != None:
+            with open(args.stats_json, 'w') as f:
+                json.dump({'games': [stats.to_dict() for stats in game_stats],
+                           'total': total.to_dict()}, f, indent=2)
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+from benchmark2048 import percentile
+from runstats2048 import Distribution
+from runstats2048 import nearest_rank
+'''
+File checks that quantiles are taken at the nearest rank, the same way by
+"percentile" in benchmark2048.py and by "Distribution.quantile" in
+runstats2048.py, on inputs small enough to check by hand.
+
+Run with:
+
+    python3 -m pytest test_quantiles.py
+'''
+
+def distribution_of(values):
+    '''
+    Returns a Distribution with every number in values added.
+    '''
+    distribution = Distribution()
+    for value in values:
+        distribution.add(value)
+    return distribution
+
+def test_nearest_rank():
+    assert nearest_rank(0.5, 1) == 1
+    assert nearest_rank(0.5, 2) == 1
+    assert nearest_rank(0.9, 2) == 2
+    assert nearest_rank(0.5, 5) == 3
+    assert nearest_rank(0.25, 10) == 3
+    assert nearest_rank(0.7, 10) == 7
+    assert nearest_rank(0.9, 10) == 9
+    assert nearest_rank(0.0, 10) == 1
+    assert nearest_rank(1.0, 10) == 10
+
+def test_percentile():
+    assert percentile([824, 354], 0.5) == 354
+    assert percentile([824, 354], 0.9) == 824
+    assert percentile([5, 1, 4, 2, 3], 0.5) == 3
+    assert percentile(range(1, 11), 0.5) == 5
+    assert percentile(range(1, 11), 0.9) == 9
+    assert percentile(range(1, 11), 0.99) == 10
+
+def test_quantile():
+    # Quantiles are read from a histogram and are within 1% of the number
+    two = distribution_of([354, 824])
+    assert abs(two.quantile(0.5) - 354) <= 354 * 0.01
+    assert abs(two.quantile(0.9) - 824) <= 824 * 0.01
+
+    five = distribution_of([5, 1, 4, 2, 3])
+    assert abs(five.quantile(0.5) - 3) <= 3 * 0.01
+    assert abs(five.quantile(0.9) - 5) <= 5 * 0.01
+
+    ten = distribution_of(range(1, 11))
+    assert abs(ten.quantile(0.5) - 5) <= 5 * 0.01
+    assert abs(ten.quantile(0.9) - 9) <= 9 * 0.01
+
+def test_quantile_with_zeros():
+    distribution = distribution_of([0, 0, 5])
+    assert distribution.quantile(0.5) == 0
+    assert abs(distribution.quantile(0.9) - 5) <= 5 * 0.01
@@ -0,0 +1,118 @@
+from classes2048 import Game2048
+from classes2048 import choose_random_piece
+from classes2048 import with_random_piece
+import math
+import random
+DRAWS = 20000
+SEED = 2048
+
+# Chi-square values that a correct distribution exceeds only 0.1% of the
+# time, by degrees of freedom
+CHI_SQUARE_LIMIT = {1: 10.83, 7: 24.32, 15: 37.70}
+# Same for the normal distribution (both sides)
+Z_LIMIT = 3.29
+'''
+File checks that new pieces are added the way the original game adds them:
+every empty space is equally likely and the piece is a four 10% of the time.
+Each test draws many pieces from a seeded generator and checks the counts
+with a chi-square test (the spaces) and a normal approximation of the
+binomial distribution (the fours), so the tests always give the same result.
+
+Run with:
+
+    python3 -m pytest test_spawn.py
+'''
+
+def board_with_empty(empty):
+    '''
+    Returns a board where only the spaces in empty are empty. The other
+    spaces hold different tiles, so none of them can combine.
+
+    Perameters:
+        empty (list of tuple: (int, int)): spaces (row, col) left empty
+    '''
+    board = [[None] * 4 for i in range(4)]
+    for i in range(4):
+        for j in range(4):
+            if (i, j) not in empty:
+                board[i][j] = 2 ** (1 + 4 * i + j)
+    return board
+
+def frozen_random_piece(board, rng):
+    '''
+    Returns the piece and location "with_random_piece" adds to a board, in
+    the same form as "choose_random_piece".
+    '''
+    frozen = tuple(tuple(row) for row in board)
+    new_board = with_random_piece(frozen, rng)
+    for i in range(4):
+        for j in range(4):
+            if new_board[i][j] != frozen[i][j]:
+                return new_board[i][j], (i, j)
+
+def check_spawns(empty, choose=choose_random_piece):
+    '''
+    Draws DRAWS pieces on a board where the spaces in empty are empty and
+    checks where they go and how often they are fours.
+
+    Perameters:
+        empty (list of tuple: (int, int)): spaces (row, col) left empty
+        choose (function): chooses a piece like "choose_random_piece"
+    '''
+    board = board_with_empty(empty)
+    rng = random.Random(SEED)
+    counts = dict((loc, 0) for loc in empty)
+    fours = 0
+    for draw in range(DRAWS):
+        piece_num, loc = choose(board, rng)
+        assert piece_num in (2, 4)
+        counts[loc] += 1
+        if piece_num == 4:
+            fours += 1
+
+    if len(empty) > 1:
+        expected = DRAWS / len(empty)
+        chi_square = sum((count - expected) ** 2 / expected for count in counts.values())
+        assert chi_square < CHI_SQUARE_LIMIT[len(empty) - 1]
+    else:
+        assert counts[empty[0]] == DRAWS
+
+    z = (fours - DRAWS * 0.1) / math.sqrt(DRAWS * 0.1 * 0.9)
+    assert abs(z) < Z_LIMIT
+
+def test_empty_board():
+    check_spawns([(i, j) for i in range(4) for j in range(4)])
+    check_spawns([(i, j) for i in range(4) for j in range(4)], frozen_random_piece)
+
+def test_half_full_board():
+    empty = [(0, 1), (0, 3), (1, 0), (1, 2), (2, 2), (3, 0), (3, 1), (3, 3)]
+    check_spawns(empty)
+    check_spawns(empty, frozen_random_piece)
+
+def test_nearly_full_board():
+    check_spawns([(1, 3), (2, 0)])
+    check_spawns([(1, 3), (2, 0)], frozen_random_piece)
+
+def test_one_empty_space():
+    check_spawns([(3, 2)])
+    check_spawns([(3, 2)], frozen_random_piece)
+
+def test_full_board():
+    board = board_with_empty([])
+    assert choose_random_piece(board, random.Random(SEED)) == None
+
+    game = Game2048(rng=random.Random(SEED))
+    game.board = board_with_empty([])
+    game.add_random_piece(game.board)
+    assert game.board == board_with_empty([])
+
+    frozen = tuple(tuple(row) for row in board)
+    assert with_random_piece(frozen, random.Random(SEED)) is frozen
+
+def test_add_random_piece():
+    game = Game2048(rng=random.Random(SEED))
+    game.board = board_with_empty([(0, 0), (2, 3)])
+    game.add_random_piece(game.board)
+    added = [(i, j) for i, j in [(0, 0), (2, 3)] if game.board[i][j] != None]
+    assert len(added) == 1
+    assert game.board[added[0][0]][added[0][1]] in (2, 4)
@@ -0,0 +1,234 @@
+from classes2048 import HeuristicWeights
+from classes2048 import DEFAULT_WEIGHTS
+from classes2048 import WEIGHT_NAMES
+from runstats2048 import RunStats
+from simulategames import play_games
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import math
+import os
+import random
+NUM_CANDIDATES = 16
+FIRST_GAMES = 10
+SPREAD = 0.5
+TUNE_SEED = 1
+CHUNK_SIZE = 5
+CONFIRM_GAMES = 200
+'''
+File tunes the weights the AI in classes2048.py uses to assess sequences of
+moves (see HeuristicWeights), by playing games with many different weights
+and keeping the ones that win most often.
+
+Playing 1000 games with every set of weights would take far too long, so the
+tuner uses successive halving:
+    1. Random sets of weights are made by scaling each default weight by a
+       random factor. The defaults are always one of the candidates.
+    2. Every candidate plays a few games (--first-games).
+    3. The worse half of the candidates, by win rate and then by mean score,
+       is dropped, and the rest play until they have played twice as many
+       games.
+    4. This is repeated until one candidate is left.
+Most games are played by the candidates that are still in the running, so
+the best weights end up with many games and a narrow confidence interval.
+
+Every candidate plays the same games: game i of every candidate is seeded
+from the master seed and i, the same way as in simulategames.py, and the AI
+draws its own random numbers from a separate generator. Every candidate gets
+the same twos and fours in the same order, placed with the same random keys,
+so the pieces only land in different spaces once the candidates' boards
+differ. The games are split across a pool of worker processes.
+
+The games that picked the best candidate make it look better than it is: of
+16 candidates, the one that was luckiest in those games is the most likely
+to win. So once the best weights are found, they play --confirm-games new
+games, with indexes after every game played while tuning, and the tuner
+prints the win rate and its 95% confidence interval from those games. --output
+writes the weights and these results to a JSON file that simulategames.py
+can play with:
+
+    python3 tune2048.py --candidates 16 --workers 8 --output weights.json
+    python3 simulategames.py --weights weights.json --seed 2
+'''
+
+def random_weights(rng, spread=SPREAD, base=DEFAULT_WEIGHTS):
+    '''
+    Returns weights made by scaling every weight of base by a random factor.
+
+    Perameters:
+        rng (random.Random): source of random numbers
+        spread (float): standard deviation of the log of the factor, e.g. 0.5
+            for factors that are mostly between 0.6 and 1.6
+        base (HeuristicWeights): weights to start from
+
+    Returns:
+        (HeuristicWeights): the new weights, rounded to whole numbers
+    '''
+    values = {}
+    for name in WEIGHT_NAMES:
+        values[name] = int(round(getattr(base, name) * math.exp(rng.gauss(0, spread))))
+    return HeuristicWeights(**values)
+
+def play_candidate(task):
+    '''
+    Plays some of the games of one candidate inside a worker process.
+
+    Perameters:
+        task (tuple: (int, HeuristicWeights, int, int, int)): (index,
+            weights, master_seed, start, num_games), where index is the
+            index of the candidate and start is the index of its first game
+
+    Returns:
+        (tuple: (int, RunStats)): the index of the candidate and statistics
+            about the games played
+    '''
+    index, weights, master_seed, start, num_games = task
+    return index, play_games(num_games, master_seed, start, weights=weights)
+
+def rank_key(results):
+    '''
+    Returns the key candidates are sorted by, best last: the win rate and
+    then the mean score.
+    '''
+    return results.win_rate(), results.scores.mean() or 0
+
+def successive_halving(candidates, first_games=FIRST_GAMES, master_seed=TUNE_SEED,
+                       workers=None, progress=None):
+    '''
+    Finds the best of a list of candidate weights with successive halving.
+
+    Perameters:
+        candidates (list of HeuristicWeights): weights to choose from
+        first_games (int): games played by every candidate in the first
+            round
+        master_seed (int): seed the games are seeded from
+        workers (int): number of worker processes, one per CPU if None
+        progress (function): if not None, called after every round with the
+            round number, the indexes of the candidates in the round (best
+            first) and the RunStats of every candidate
+
+    Returns:
+        (tuple: (int, list of RunStats)): the index of the best candidate and
+            the statistics of every candidate
+    '''
+    results = [RunStats() for candidate in candidates]
+    alive = list(range(len(candidates)))
+    games = first_games
+    round_number = 1
+    with ProcessPoolExecutor(workers) as pool:
+        while True:
+            # Candidates still in the running play up to the same number of
+            # games, in small chunks so every worker has something to do
+            tasks = []
+            for index in alive:
+                for start in range(results[index].games, games, CHUNK_SIZE):
+                    tasks.append((index, candidates[index], master_seed, start,
+                                  min(CHUNK_SIZE, games - start)))
+            for index, chunk_results in pool.map(play_candidate, tasks):
+                results[index].merge(chunk_results)
+
+            alive.sort(key=lambda index: rank_key(results[index]), reverse=True)
+            if progress != None:
+                progress(round_number, alive, results)
+            if len(alive) == 1:
+                return alive[0], results
+            del alive[(len(alive) + 1) // 2:]
+            games *= 2
+            round_number += 1
+
+def confirm(weights, start, num_games, master_seed=TUNE_SEED, workers=None):
+    '''
+    Plays new games with a set of weights, to measure its win rate on games
+    that played no part in choosing it.
+
+    Perameters:
+        weights (HeuristicWeights): the weights to play with
+        start (int): index of the first game, after every game played while
+            tuning
+        num_games (int): number of games to play
+        master_seed (int): seed the games are seeded from
+        workers (int): number of worker processes, one per CPU if None
+
+    Returns:
+        results (RunStats): statistics about the games played
+    '''
+    results = RunStats()
+    end = start + num_games
+    tasks = [(0, weights, master_seed, chunk_start, min(CHUNK_SIZE, end - chunk_start))
+             for chunk_start in range(start, end, CHUNK_SIZE)]
+    with ProcessPoolExecutor(workers) as pool:
+        for index, chunk_results in pool.map(play_candidate, tasks):
+            results.merge(chunk_results)
+    return results
+
+def print_round(round_number, alive, results):
+    print("Round", round_number, "-", len(alive), "candidate" if len(alive) == 1 else "candidates",
+          "with", results[alive[0]].games, "games each")
+    for index in alive:
+        low, high = results[index].win_interval()
+        print("    candidate", index, "win rate", str(round(100 * results[index].win_rate(), 1)) + "%",
+              "(" + str(round(100 * low, 1)) + "% to " + str(round(100 * high, 1)) + "%)",
+              "mean score", round(results[index].scores.mean()))
+    print(flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Tune the weights of the 2048 AI.')
+    parser.add_argument('--candidates', type=int, default=NUM_CANDIDATES,
+                        help='number of sets of weights to try')
+    parser.add_argument('--first-games', type=int, default=FIRST_GAMES,
+                        help='games played by every candidate in the first round')
+    parser.add_argument('--spread', type=float, default=SPREAD,
+                        help='how far the random weights are from the defaults')
+    parser.add_argument('--seed', type=int, default=TUNE_SEED,
+                        help='seed for the random weights and the games')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='number of processes used to play the games')
+    parser.add_argument('--confirm-games', type=int, default=CONFIRM_GAMES,
+                        help='new games played by the best weights to measure their win rate')
+    parser.add_argument('--output', default=None,
+                        help='write the best weights and their results to this JSON file')
+    args = parser.parse_args()
+
+    if args.candidates < 1:
+        parser.error('--candidates must be at least 1')
+    if args.first_games < 1:
+        parser.error('--first-games must be at least 1')
+    if args.confirm_games < 1:
+        parser.error('--confirm-games must be at least 1')
+
+    rng = random.Random(args.seed)
+    candidates = [DEFAULT_WEIGHTS]
+    while len(candidates) < args.candidates:
+        candidates.append(random_weights(rng, args.spread))
+
+    best, results = successive_halving(candidates, args.first_games, args.seed,
+                                       args.workers, print_round)
+    if best == 0:
+        print("Best weights: candidate 0 (the defaults)")
+    else:
+        print("Best weights: candidate", best)
+    print(json.dumps(candidates[best].to_dict(), indent=2))
+    print("Win rate while tuning", str(round(100 * results[best].win_rate(), 1)) + "%",
+          "over", results[best].games, "games (optimistic, since these games chose it)")
+
+    # Every candidate played games 0 to results[best].games - 1 at most
+    best_results = confirm(candidates[best], results[best].games, args.confirm_games,
+                           args.seed, args.workers)
+    low, high = best_results.win_interval()
+    print("Win rate", str(round(100 * best_results.win_rate(), 1)) + "%",
+          "with 95% confidence interval", str(round(100 * low, 1)) + "% to " +
+          str(round(100 * high, 1)) + "%", "over", best_results.games, "new games")
+    print("Games played:", sum(stats.games for stats in results) + best_results.games)
+
+    if args.output != None:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'weights': candidates[best].to_dict(),
+                'win_rate': best_results.win_rate(),
+                'win_interval': [low, high],
+                'results': best_results.to_dict(),
+                'tuning_win_rate': results[best].win_rate(),
+            }, f, indent=2)
+
+if __name__ == '__main__':
+    main()